@@ -3,11 +3,21 @@ LangChain-powered Medical Scheduling Agent
 Uses LangChain tools and agents for enhanced conversation and functionality.
 """
 
+import asyncio
+import hashlib
+import inspect
 import json
 import os
 import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Any, Optional
+from functools import lru_cache, partial
+from typing import AsyncIterator, Callable, Dict, List, Any, NamedTuple, Optional, Tuple
 
 # Try to import email_validator, but make it optional
 try:
@@ -29,13 +39,28 @@ except ImportError:
     class EmailNotValidError(Exception):
         pass
 
+# Try to import re2 (linear-time regex engine) for carrier matching, but make it optional
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+# Try to import rapidfuzz for typo-tolerant name suggestions, but make it optional
+try:
+    from rapidfuzz import fuzz, process as fuzz_process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
 # Try to import LangChain components, but make them optional
 try:
     from langchain.agents import AgentExecutor, create_openai_tools_agent
     from langchain.tools import tool
     from langchain_openai import ChatOpenAI
     from langchain.prompts import ChatPromptTemplate
-    from langchain_core.messages import HumanMessage, SystemMessage
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    from langchain_core.outputs import LLMResult, Generation
     LANGCHAIN_AVAILABLE = True
 except ImportError:
     LANGCHAIN_AVAILABLE = False
@@ -58,10 +83,13 @@ except ImportError:
     def create_openai_tools_agent(*args, **kwargs):
         return None
 
+from app.utils import json_store
+from app.utils.simple_gemini import SimpleGeminiResponse
+
 # Try to import utility managers, but make them optional
 try:
-    from app.utils.calendar_manager import CalendarManager
-    from app.utils.notification_manager import NotificationManager
+    from app.utils.calendar_manager import CalendarManager, get_calendar_manager
+    from app.utils.notification_manager import NotificationManager, get_notification_manager
     UTILS_AVAILABLE = True
 except ImportError:
     UTILS_AVAILABLE = False
@@ -73,9 +101,272 @@ except ImportError:
     class NotificationManager:
         def __init__(self, data_dir):
             self.data_dir = data_dir
+    
+    def get_calendar_manager(data_dir):
+        return CalendarManager(data_dir)
+    
+    def get_notification_manager(data_dir):
+        return NotificationManager(data_dir)
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of tool calls executed concurrently within a single agent step
+TOOL_CONCURRENCY_LIMIT = int(os.getenv("TOOL_CONCURRENCY_LIMIT", "5"))
+
+# Read-only tools that may run side by side when the LLM requests several at once.
+# Tools that write appointments stay sequential to avoid read-modify-write races.
+PARALLEL_SAFE_TOOLS = frozenset({
+    "search_patient",
+    "get_available_doctors",
+    "check_doctor_availability",
+    "get_calendar_availability",
+    "validate_insurance",
+    "get_patient_appointments",
+})
+
+# Half-hour slots of the 9 AM - 5 PM day, as bit positions in a booked-slots mask
+_SLOT_BITS = {
+    f"{9 + i // 2:02d}:{(i % 2) * 30:02d}": i
+    for i in range(16)
+}
+# Hourly slots offered by check_doctor_availability, with their bit positions
+_HOURLY_SLOTS = tuple((f"{hour:02d}:00", (hour - 9) * 2) for hour in range(9, 17))
+
+# Shared system instructions for the scheduling agent prompts
+SYSTEM_PROMPT = """You are a professional medical scheduling assistant for HealthCare+ Medical Center.
+
+Your responsibilities:
+1. Help patients schedule, reschedule, or cancel appointments
+2. Look up patient information and appointment history
+3. Collect and validate insurance information
+4. Provide doctor availability and schedule information
+5. Ensure accurate patient data collection (name, DOB, contact info)
+
+Key guidelines:
+- Always be professional, empathetic, and helpful
+- For new patients: collect full information (name, DOB, contact, insurance)
+- For returning patients: verify identity with name and DOB
+- New patient appointments are 60 minutes, returning patients are 30 minutes
+- Always confirm appointment details before booking
+- Ask for insurance information for all appointments
+- Be clear about next steps and what patients should expect
+"""
+
+# Prompt templates are built once per process and shared by all agent instances
+OPENAI_TOOLS_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+Use the available tools to search for patients, check doctor availability, book appointments, and validate insurance information.
+"""
+
+# Prompt template for the OpenAI tools agent; the system prompt has no
+# placeholders, so it is a ready-made message rather than a template to format
+OPENAI_TOOLS_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(content=OPENAI_TOOLS_SYSTEM_PROMPT) if LANGCHAIN_AVAILABLE else ("system", OPENAI_TOOLS_SYSTEM_PROMPT),
+    ("human", "{input}"),
+    ("placeholder", "{agent_scratchpad}")
+])
+
+# Prompt template for the React agent (with tools and tool_names)
+REACT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT + """
+You have access to the following tools:
+{tools}
+
+Tool names: {tool_names}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+"""),
+    ("human", "{input}"),
+    ("placeholder", "{agent_scratchpad}")
+])
+
+# Insurance carriers accepted by validate_insurance (matched as substrings)
+VALID_CARRIERS = (
+    "blue cross", "aetna", "cigna", "united healthcare", "humana",
+    "kaiser", "anthem", "bcbs", "medicare", "medicaid"
+)
+
+# Single alternation over all carriers, so a carrier name is scanned once
+_CARRIER_PATTERN = "|".join(re.escape(vc) for vc in VALID_CARRIERS)
+_CARRIER_RE = re2.compile(_CARRIER_PATTERN) if RE2_AVAILABLE else re.compile(_CARRIER_PATTERN)
+
+_tool_pool = None
+_background_pool = None
+
+# Set while ParallelAgentExecutor collects the tool calls of one step
+_defer_tool_calls = ContextVar("defer_tool_calls", default=False)
+
+
+class _DataIndex(NamedTuple):
+    """A loaded data file and the lookup indexes built from it, replaced as a whole when the file changes."""
+    data: List[Dict]
+    # Records by ID (patients and appointments)
+    by_id: Dict[str, Dict]
+    # Lowercased search field, parallel to data: full names of patients and
+    # doctors, patient names of appointments
+    names: Tuple[str, ...]
+    # Lowercased doctor specialties, parallel to data
+    specialties: Tuple[str, ...]
+    # Booked half-hour slots per (doctor_id, date), as a bitmask over _SLOT_BITS
+    booked_masks: Dict[tuple, int]
+
+
+_EMPTY_INDEX = _DataIndex([], {}, (), (), {})
+
+
+def _build_index(filename: str, data: List[Dict]) -> _DataIndex:
+    """Build the lookup indexes of a freshly loaded data file."""
+    if filename == "patients.json":
+        return _DataIndex(data, {p['patient_id']: p for p in data},
+                          tuple(f"{p['first_name']} {p['last_name']}".lower() for p in data), (), {})
+    if filename == "doctors.json":
+        return _DataIndex(data, {},
+                          tuple(f"{d['first_name']} {d['last_name']}".lower() for d in data),
+                          tuple(d['specialty'].lower() for d in data), {})
+    if filename == "appointments.json":
+        booked_masks: Dict[tuple, int] = {}
+        for a in data:
+            bit = _SLOT_BITS.get(a.get('time'))
+            if bit is not None:
+                key = (a.get('doctor_id'), a.get('date'))
+                booked_masks[key] = booked_masks.get(key, 0) | (1 << bit)
+        return _DataIndex(data, {a['appointment_id']: a for a in data},
+                          tuple(a.get('patient_name', '').lower() for a in data), (), booked_masks)
+    return _DataIndex(data, {}, (), (), {})
+
+
+class _Turn:
+    """State of one agent run over one input, shared by the tool calls it makes."""
+    __slots__ = ("agent", "indexes", "patient")
+    
+    def __init__(self, agent):
+        self.agent = agent
+        # Data files loaded during the turn, keyed by filename
+        self.indexes: Dict[str, _DataIndex] = {}
+        # (patient_id, lowercased full name) of the patient search_patient identified
+        self.patient: Optional[Tuple[str, str]] = None
+
+
+# The turn running in this context; tool threads see it through copy_context()
+_current_turn: ContextVar[Optional[_Turn]] = ContextVar("current_turn", default=None)
+
+
+@lru_cache(maxsize=1024)
+def _name_parts(name: str) -> tuple:
+    """Split a name query into lowercased parts."""
+    return tuple(name.lower().split())
+
+
+@lru_cache(maxsize=256)
+def _is_known_carrier(carrier_lower: str) -> bool:
+    """Check whether a lowercased carrier name contains a known carrier."""
+    return _CARRIER_RE.search(carrier_lower) is not None
+
+
+def _get_tool_pool() -> ThreadPoolExecutor:
+    """Get the shared thread pool used for concurrent tool and notification calls."""
+    global _tool_pool
+    if _tool_pool is None:
+        _tool_pool = ThreadPoolExecutor(
+            max_workers=TOOL_CONCURRENCY_LIMIT,
+            thread_name_prefix="agent-tool"
+        )
+    return _tool_pool
+
+
+def _log_background_failure(future):
+    """Log an exception raised by a fire-and-forget background task."""
+    error = future.exception()
+    if error is not None:
+        logger.error("Background notification task failed: %s", error)
+
+
+def _submit_background(func, *args):
+    """Run a notification side effect in the background without waiting for it."""
+    global _background_pool
+    if _background_pool is None:
+        _background_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="agent-notify")
+    future = _background_pool.submit(copy_context().run, func, *args)
+    future.add_done_callback(_log_background_failure)
+    return future
+
+
+class _DeferredToolCall(NamedTuple):
+    """A tool call collected by ParallelAgentExecutor, to be performed later."""
+    agent_action: Any
+    perform: Callable[[], Any]
+    
+    def __call__(self):
+        return self.perform()
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs independent read-only tool calls of a step concurrently.
+    
+    It overrides private AgentExecutor methods, so it is only used where
+    PARALLEL_EXECUTOR_SUPPORTED confirms they look as expected.
+    """
+    
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        """Defer the tool call while the current step is being collected."""
+        if _defer_tool_calls.get():
+            return _DeferredToolCall(agent_action, partial(
+                super()._perform_agent_action, name_to_tool_map, color_mapping, agent_action, run_manager
+            ))
+        return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+    
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        """Plan the next step, then run its tool calls in parallel when they are all read-only."""
+        token = _defer_tool_calls.set(True)
+        try:
+            items = list(super()._iter_next_step(
+                name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+            ))
+        finally:
+            _defer_tool_calls.reset(token)
+        
+        calls = [item for item in items if isinstance(item, _DeferredToolCall)]
+        for item in items:
+            if not isinstance(item, _DeferredToolCall):
+                yield item
+        
+        if len(calls) > 1 and all(call.agent_action.tool in PARALLEL_SAFE_TOOLS for call in calls):
+            pool = _get_tool_pool()
+            futures = [pool.submit(copy_context().run, call) for call in calls]
+            for future in futures:
+                yield future.result()
+        else:
+            for call in calls:
+                yield call()
+
+
+def _has_parameters(cls, method_name: str, parameters: List[str]) -> bool:
+    """Check that a method exists and takes exactly the given parameters."""
+    try:
+        return list(inspect.signature(getattr(cls, method_name)).parameters) == parameters
+    except (AttributeError, TypeError, ValueError):
+        return False
+
+
+# Whether AgentExecutor has the private methods ParallelAgentExecutor overrides,
+# with the parameters it passes; otherwise the stock executor is used
+PARALLEL_EXECUTOR_SUPPORTED = LANGCHAIN_AVAILABLE and _has_parameters(
+    AgentExecutor, "_perform_agent_action",
+    ["self", "name_to_tool_map", "color_mapping", "agent_action", "run_manager"]
+) and _has_parameters(
+    AgentExecutor, "_iter_next_step",
+    ["self", "name_to_tool_map", "color_mapping", "inputs", "intermediate_steps", "run_manager"]
+)
+
 
 class LangChainMedicalAgent:
     """LangChain-powered Medical Scheduling Agent with advanced tools."""
@@ -85,14 +376,19 @@ class LangChainMedicalAgent:
         self.data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
         self.conversation_state = {}
         self.provider = provider
+        # Data file paths keyed by filename, joined on first use
+        self._data_paths: Dict[str, str] = {}
+        # Latest index of each data file, keyed by filename; rebuilt whenever the
+        # file is re-read and swapped in whole, so concurrent tools never see a mix
+        self._indexes: Dict[str, _DataIndex] = {}
         
         # Check if LangChain is available
         if not LANGCHAIN_AVAILABLE:
             raise ImportError("LangChain is not available. Please install langchain packages or use the mock agent.")
         
         # Initialize managers
-        self.calendar_manager = CalendarManager(self.data_dir)
-        self.notification_manager = NotificationManager(self.data_dir)
+        self.calendar_manager = get_calendar_manager(self.data_dir)
+        self.notification_manager = get_notification_manager(self.data_dir)
         
         # Initialize LLM
         if llm is None and api_key:
@@ -111,7 +407,7 @@ class LangChainMedicalAgent:
                         # Fallback to custom Gemini wrapper
                         from app.utils.simple_gemini import SimpleGeminiClient
                         gemini_client = SimpleGeminiClient(api_key)
-                        self.llm = GeminiLangChainWrapper(gemini_client)
+                        self.llm = GeminiLangChainWrapper(gemini_client, temperature=0.3)
                         logger.info("Custom Gemini LangChain wrapper initialized")
                 else:  # provider == "openai"
                     self.llm = ChatOpenAI(
@@ -121,7 +417,7 @@ class LangChainMedicalAgent:
                     )
                     logger.info("ChatOpenAI initialized successfully")
             except Exception as e:
-                logger.error(f"Failed to initialize {provider} LLM: {e}")
+                logger.error("Failed to initialize %s LLM: %s", provider, e)
                 # Initialize fallback when API key is invalid or API fails
                 logger.info("Initializing with fallback LLM wrapper")
                 self.llm = FallbackLLMWrapper()
@@ -136,7 +432,7 @@ class LangChainMedicalAgent:
         self.tools = self._create_tools()
         self.agent_executor = self._create_agent()
         
-        logger.info(f"LangChainMedicalAgent initialized with {provider}")
+        logger.info("LangChainMedicalAgent initialized with %s", provider)
     
     def _create_tools(self):
         """Create LangChain tools for medical scheduling."""
@@ -145,18 +441,22 @@ class LangChainMedicalAgent:
         def search_patient(name: str) -> str:
             """Search for a patient by name in the database."""
             try:
-                patients = self._load_data("patients.json")
-                name_parts = name.lower().split()
+                index = self._load_index("patients.json")
+                patients = index.data
+                name_parts = _name_parts(name)
                 
-                matching_patients = []
-                for patient in patients:
-                    patient_name = f"{patient['first_name']} {patient['last_name']}".lower()
-                    if all(part in patient_name for part in name_parts):
-                        matching_patients.append(patient)
+                matching_patients = [
+                    patient for patient, patient_name in zip(patients, index.names)
+                    if all(part in patient_name for part in name_parts)
+                ]
                 
                 if matching_patients:
                     if len(matching_patients) == 1:
                         patient = matching_patients[0]
+                        # Remember the identified patient for a booking later in this turn
+                        turn = self._turn()
+                        if turn is not None:
+                            turn.patient = (patient['patient_id'], f"{patient['first_name']} {patient['last_name']}".lower())
                         return f"Found patient: {patient['first_name']} {patient['last_name']}, DOB: {patient['date_of_birth']}, Patient ID: {patient['patient_id']}"
                     else:
                         result = f"Found {len(matching_patients)} patients with similar names:\n"
@@ -164,19 +464,36 @@ class LangChainMedicalAgent:
                             result += f"{i+1}. {patient['first_name']} {patient['last_name']}, DOB: {patient['date_of_birth']}\n"
                         return result
                 else:
+                    if RAPIDFUZZ_AVAILABLE:
+                        # Suggest close spellings; never auto-select a patient from a fuzzy hit
+                        suggestions = fuzz_process.extract(
+                            name.lower(), index.names,
+                            scorer=fuzz.WRatio, score_cutoff=70, limit=3
+                        )
+                        if suggestions:
+                            result = f"No exact match for '{name}'. Did you mean:\n"
+                            for i, (_, _, index) in enumerate(suggestions):
+                                patient = patients[index]
+                                result += f"{i+1}. {patient['first_name']} {patient['last_name']}, DOB: {patient['date_of_birth']}\n"
+                            return result
                     return f"No patient found with name '{name}'. This appears to be a new patient."
             except Exception as e:
-                logger.error(f"Error searching patient: {e}")
+                logger.error("Error searching patient: %s", e)
                 return f"Error searching for patient: {e}"
         
         @tool
         def get_available_doctors(specialty: str = "") -> str:
             """Get list of available doctors, optionally filtered by specialty."""
             try:
-                doctors = self._load_data("doctors.json")
+                index = self._load_index("doctors.json")
+                doctors = index.data
                 
                 if specialty:
-                    filtered_doctors = [d for d in doctors if specialty.lower() in d['specialty'].lower()]
+                    specialty_lower = specialty.lower()
+                    filtered_doctors = [
+                        d for d, d_specialty in zip(doctors, index.specialties)
+                        if specialty_lower in d_specialty
+                    ]
                 else:
                     filtered_doctors = doctors
                 
@@ -189,38 +506,29 @@ class LangChainMedicalAgent:
                 
                 return result
             except Exception as e:
-                logger.error(f"Error getting doctors: {e}")
+                logger.error("Error getting doctors: %s", e)
                 return f"Error retrieving doctors: {e}"
         
         @tool
         def check_doctor_availability(doctor_name: str, date: str) -> str:
             """Check if a doctor is available on a specific date."""
             try:
-                doctors = self._load_data("doctors.json")
-                appointments = self._load_data("appointments.json")
+                appointments_index = self._load_index("appointments.json")
                 
                 # Find doctor
-                doctor = None
-                for d in doctors:
-                    if doctor_name.lower() in f"{d['first_name']} {d['last_name']}".lower():
-                        doctor = d
-                        break
+                doctor = self._find_doctor_by_name(doctor_name)
                 
                 if not doctor:
                     return f"Doctor '{doctor_name}' not found."
                 
-                # Check existing appointments for that date
-                existing_appointments = [
-                    a for a in appointments 
-                    if a['doctor_id'] == doctor['doctor_id'] and a['date'] == date
-                ]
+                # Existing appointments for that date, as a bitmask of booked slots
+                booked_mask = appointments_index.booked_masks.get((doctor['doctor_id'], date), 0)
                 
                 # Simulate available time slots (9 AM - 5 PM, 1-hour slots)
-                available_slots = []
-                for hour in range(9, 17):
-                    time_slot = f"{hour:02d}:00"
-                    if not any(a['time'] == time_slot for a in existing_appointments):
-                        available_slots.append(time_slot)
+                available_slots = [
+                    time_slot for time_slot, bit in _HOURLY_SLOTS
+                    if not (booked_mask >> bit) & 1
+                ]
                 
                 if available_slots:
                     return f"Dr. {doctor['first_name']} {doctor['last_name']} is available on {date} at: {', '.join(available_slots[:5])}"
@@ -228,38 +536,32 @@ class LangChainMedicalAgent:
                     return f"Dr. {doctor['first_name']} {doctor['last_name']} has no available slots on {date}."
                     
             except Exception as e:
-                logger.error(f"Error checking availability: {e}")
+                logger.error("Error checking availability: %s", e)
                 return f"Error checking doctor availability: {e}"
         
         @tool
         def book_appointment_enhanced(patient_name: str, doctor_name: str, date: str, time: str, patient_type: str = "returning", patient_email: str = "", patient_phone: str = "") -> str:
             """Book an appointment with enhanced calendar integration and notifications."""
             try:
-                # Load data
-                patients = self._load_data("patients.json")
-                doctors = self._load_data("doctors.json")
-                
-                # Find patient
+                # Find patient, reusing the one identified earlier in this turn
                 patient = None
-                for p in patients:
-                    if patient_name.lower() in f"{p['first_name']} {p['last_name']}".lower():
-                        patient = p
-                        break
+                turn = self._turn()
+                if turn is not None and turn.patient and patient_name.lower() in turn.patient[1]:
+                    patient = self._get_patient_by_id(turn.patient[0])
+                if not patient:
+                    patient = self._find_patient_by_name(patient_name)
                 
                 if not patient:
                     return f"Patient '{patient_name}' not found. Please register first."
                 
                 # Find doctor
-                doctor = None
-                for d in doctors:
-                    if doctor_name.lower() in f"{d['first_name']} {d['last_name']}".lower():
-                        doctor = d
-                        break
+                doctor = self._find_doctor_by_name(doctor_name)
                 
                 if not doctor:
                     return f"Doctor '{doctor_name}' not found."
                 
-                # Update patient contact info if provided
+                # Update patient contact info if provided (on a copy, the loaded record is cached)
+                patient = dict(patient)
                 if patient_email:
                     patient['email'] = patient_email
                 if patient_phone:
@@ -279,20 +581,23 @@ class LangChainMedicalAgent:
                 booking_result = self.calendar_manager.book_slot(
                     doctor['doctor_id'], date, time, patient_data, duration
                 )
+                self._invalidate_turn_data("appointments.json")
                 
                 if not booking_result.get('success'):
                     return f"❌ {booking_result.get('message', 'Booking failed')}"
                 
                 appointment = booking_result['appointment']
                 
-                # Send confirmation email
-                confirmation_result = self.notification_manager.send_confirmation_email(appointment, patient)
+                # Reminders don't affect the reply, so schedule them in the background
+                _submit_background(self.notification_manager.schedule_reminders, appointment, patient)
                 
-                # Send intake forms
-                forms_result = self.notification_manager.send_intake_forms(appointment, patient)
+                # Send confirmation email and intake forms concurrently; the reply reports their results
+                pool = _get_tool_pool()
+                confirmation_future = pool.submit(self.notification_manager.send_confirmation_email, appointment, patient)
+                forms_future = pool.submit(self.notification_manager.send_intake_forms, appointment, patient)
                 
-                # Schedule reminders
-                self.notification_manager.schedule_reminders(appointment, patient)
+                confirmation_result = confirmation_future.result()
+                forms_result = forms_future.result()
                 
                 result_message = f"✅ Appointment booked successfully!\n\n"
                 result_message += f"**Appointment Details:**\n"
@@ -315,21 +620,15 @@ class LangChainMedicalAgent:
                 return result_message
                 
             except Exception as e:
-                logger.error(f"Error booking appointment: {e}")
+                logger.error("Error booking appointment: %s", e)
                 return f"Error booking appointment: {e}"
         
         @tool 
         def get_calendar_availability(doctor_name: str, date: str, duration_minutes: int = 30) -> str:
             """Get available time slots for a doctor on a specific date."""
             try:
-                doctors = self._load_data("doctors.json")
-                
                 # Find doctor
-                doctor = None
-                for d in doctors:
-                    if doctor_name.lower() in f"{d['first_name']} {d['last_name']}".lower():
-                        doctor = d
-                        break
+                doctor = self._find_doctor_by_name(doctor_name)
                 
                 if not doctor:
                     return f"Doctor '{doctor_name}' not found."
@@ -352,7 +651,7 @@ class LangChainMedicalAgent:
                 return result
                 
             except Exception as e:
-                logger.error(f"Error getting availability: {e}")
+                logger.error("Error getting availability: %s", e)
                 return f"Error checking availability: {e}"
         
         @tool
@@ -360,6 +659,7 @@ class LangChainMedicalAgent:
             """Reschedule an existing appointment to a new date and time."""
             try:
                 result = self.calendar_manager.reschedule_appointment(appointment_id, new_date, new_time)
+                self._invalidate_turn_data("appointments.json")
                 
                 if not result.get('success'):
                     return f"❌ {result.get('message', 'Rescheduling failed')}"
@@ -367,22 +667,19 @@ class LangChainMedicalAgent:
                 appointment = result['appointment']
                 
                 # Load patient data for notifications
-                patients = self._load_data("patients.json")
-                patient = next((p for p in patients if p['patient_id'] == appointment['patient_id']), None)
+                patient = self._get_patient_by_id(appointment['patient_id'])
                 
                 if patient:
-                    # Send rescheduling confirmation
-                    confirmation_result = self.notification_manager.send_confirmation_email(appointment, patient)
-                    
-                    # Reschedule reminders
-                    self.notification_manager.schedule_reminders(appointment, patient)
+                    # Send rescheduling confirmation and reschedule reminders in the background
+                    _submit_background(self.notification_manager.send_confirmation_email, appointment, patient)
+                    _submit_background(self.notification_manager.schedule_reminders, appointment, patient)
                 
                 return f"✅ {result.get('message', 'Appointment rescheduled successfully')}\n\n" \
                        f"📧 New confirmation sent to patient\n" \
                        f"🕐 Reminders updated for new date"
                 
             except Exception as e:
-                logger.error(f"Error rescheduling appointment: {e}")
+                logger.error("Error rescheduling appointment: %s", e)
                 return f"Error rescheduling appointment: {e}"
         
         @tool
@@ -390,6 +687,7 @@ class LangChainMedicalAgent:
             """Cancel an existing appointment."""
             try:
                 result = self.calendar_manager.cancel_appointment(appointment_id, reason)
+                self._invalidate_turn_data("appointments.json")
                 
                 if not result.get('success'):
                     return f"❌ {result.get('message', 'Cancellation failed')}"
@@ -397,12 +695,11 @@ class LangChainMedicalAgent:
                 appointment = result['appointment']
                 
                 # Load patient data
-                patients = self._load_data("patients.json")
-                patient = next((p for p in patients if p['patient_id'] == appointment['patient_id']), None)
+                patient = self._get_patient_by_id(appointment['patient_id'])
                 
                 if patient:
                     # Send cancellation confirmation (simulated)
-                    logger.info(f"📧 Cancellation confirmation sent to {patient.get('email', 'N/A')}")
+                    logger.info("📧 Cancellation confirmation sent to %s", patient.get('email', 'N/A'))
                     print(f"\n📧 Cancellation confirmation sent to: {patient.get('first_name', '')} {patient.get('last_name', '')}")
                 
                 return f"✅ {result.get('message', 'Appointment cancelled successfully')}\n\n" \
@@ -410,7 +707,7 @@ class LangChainMedicalAgent:
                        f"Reason: {reason or 'No reason provided'}"
                 
             except Exception as e:
-                logger.error(f"Error cancelling appointment: {e}")
+                logger.error("Error cancelling appointment: %s", e)
                 return f"Error cancelling appointment: {e}"
         
         @tool
@@ -427,24 +724,20 @@ class LangChainMedicalAgent:
                     return "❌ Failed to export appointments to Excel."
                 
             except Exception as e:
-                logger.error(f"Error exporting to Excel: {e}")
+                logger.error("Error exporting to Excel: %s", e)
                 return f"Error exporting appointments: {e}"
         
         @tool
         def send_reminder_now(appointment_id: str, reminder_type: str = "first") -> str:
             """Send a reminder for a specific appointment immediately."""
             try:
-                # Load data
-                appointments = self._load_data("appointments.json")
-                patients = self._load_data("patients.json")
-                
                 # Find appointment
-                appointment = next((a for a in appointments if a['appointment_id'] == appointment_id), None)
+                appointment = self._get_appointment_by_id(appointment_id)
                 if not appointment:
                     return f"Appointment {appointment_id} not found."
                 
                 # Find patient
-                patient = next((p for p in patients if p['patient_id'] == appointment['patient_id']), None)
+                patient = self._get_patient_by_id(appointment['patient_id'])
                 if not patient:
                     return f"Patient not found for appointment {appointment_id}."
                 
@@ -468,7 +761,7 @@ class LangChainMedicalAgent:
                     return f"❌ Failed to send reminder: {result.get('message', 'Unknown error')}"
                 
             except Exception as e:
-                logger.error(f"Error sending reminder: {e}")
+                logger.error("Error sending reminder: %s", e)
                 return f"Error sending reminder: {e}"
         
         @tool
@@ -483,29 +776,25 @@ class LangChainMedicalAgent:
                     return "❌ Invalid member ID. Must be at least 5 characters."
                 
                 # Simulate insurance validation
-                valid_carriers = [
-                    "blue cross", "aetna", "cigna", "united healthcare", "humana",
-                    "kaiser", "anthem", "bcbs", "medicare", "medicaid"
-                ]
-                
-                if any(vc in carrier.lower() for vc in valid_carriers):
+                if _is_known_carrier(carrier.lower()):
                     return f"✅ Insurance validated: {carrier}, Member ID: {member_id}" + (f", Group: {group_number}" if group_number else "")
                 else:
                     return f"⚠️ Insurance carrier '{carrier}' not recognized. Please verify spelling."
                     
             except Exception as e:
-                logger.error(f"Error validating insurance: {e}")
+                logger.error("Error validating insurance: %s", e)
                 return f"Error validating insurance: {e}"
         
         @tool
         def get_patient_appointments(patient_name: str) -> str:
             """Get all appointments for a specific patient."""
             try:
-                appointments = self._load_data("appointments.json")
+                index = self._load_index("appointments.json")
                 
+                name_lower = patient_name.lower()
                 patient_appointments = [
-                    a for a in appointments 
-                    if patient_name.lower() in a['patient_name'].lower()
+                    a for a, a_patient_name in zip(index.data, index.names)
+                    if name_lower in a_patient_name
                 ]
                 
                 if not patient_appointments:
@@ -518,7 +807,7 @@ class LangChainMedicalAgent:
                 return result
                 
             except Exception as e:
-                logger.error(f"Error getting patient appointments: {e}")
+                logger.error("Error getting patient appointments: %s", e)
                 return f"Error retrieving appointments: {e}"
         
         return [
@@ -538,72 +827,6 @@ class LangChainMedicalAgent:
     def _create_agent(self):
         """Create the LangChain agent with tools."""
         try:
-            # Define the prompt template for OpenAI tools agent
-            openai_prompt = ChatPromptTemplate.from_messages([
-                ("system", """You are a professional medical scheduling assistant for HealthCare+ Medical Center.
-
-Your responsibilities:
-1. Help patients schedule, reschedule, or cancel appointments
-2. Look up patient information and appointment history
-3. Collect and validate insurance information
-4. Provide doctor availability and schedule information
-5. Ensure accurate patient data collection (name, DOB, contact info)
-
-Key guidelines:
-- Always be professional, empathetic, and helpful
-- For new patients: collect full information (name, DOB, contact, insurance)
-- For returning patients: verify identity with name and DOB
-- New patient appointments are 60 minutes, returning patients are 30 minutes
-- Always confirm appointment details before booking
-- Ask for insurance information for all appointments
-- Be clear about next steps and what patients should expect
-
-Use the available tools to search for patients, check doctor availability, book appointments, and validate insurance information.
-"""),
-                ("human", "{input}"),
-                ("placeholder", "{agent_scratchpad}")
-            ])
-            
-            # Define the prompt template for React agent (with tools and tool_names)
-            react_prompt = ChatPromptTemplate.from_messages([
-                ("system", """You are a professional medical scheduling assistant for HealthCare+ Medical Center.
-
-Your responsibilities:
-1. Help patients schedule, reschedule, or cancel appointments
-2. Look up patient information and appointment history
-3. Collect and validate insurance information
-4. Provide doctor availability and schedule information
-5. Ensure accurate patient data collection (name, DOB, contact info)
-
-Key guidelines:
-- Always be professional, empathetic, and helpful
-- For new patients: collect full information (name, DOB, contact, insurance)
-- For returning patients: verify identity with name and DOB
-- New patient appointments are 60 minutes, returning patients are 30 minutes
-- Always confirm appointment details before booking
-- Ask for insurance information for all appointments
-- Be clear about next steps and what patients should expect
-
-You have access to the following tools:
-{tools}
-
-Tool names: {tool_names}
-
-Use the following format:
-
-Question: the input question you must answer
-Thought: you should always think about what to do
-Action: the action to take, should be one of [{tool_names}]
-Action Input: the input to the action
-Observation: the result of the action
-... (this Thought/Action/Action Input/Observation can repeat N times)
-Thought: I now know the final answer
-Final Answer: the final answer to the original input question
-"""),
-                ("human", "{input}"),
-                ("placeholder", "{agent_scratchpad}")
-            ])
-            
             # Create the agent - use different agent types based on provider
             if isinstance(self.llm, FallbackLLMWrapper):
                 # For fallback LLM, create a simple fallback executor
@@ -613,19 +836,20 @@ Final Answer: the final answer to the original input question
                 # For Gemini, try OpenAI tools agent first, then fall back to React agent
                 try:
                     # Try to use OpenAI tools agent anyway - it might work
-                    agent = create_openai_tools_agent(self.llm, self.tools, openai_prompt)
+                    agent = create_openai_tools_agent(self.llm, self.tools, OPENAI_TOOLS_PROMPT)
                 except Exception as e:
-                    logger.warning(f"Could not create OpenAI tools agent for Gemini: {e}")
+                    logger.warning("Could not create OpenAI tools agent for Gemini: %s", e)
                     # Create a simple reactive agent as fallback
                     from langchain.agents import create_react_agent
-                    agent = create_react_agent(self.llm, self.tools, react_prompt)
+                    agent = create_react_agent(self.llm, self.tools, REACT_PROMPT)
             else:
                 # For OpenAI, use the standard OpenAI tools agent
-                agent = create_openai_tools_agent(self.llm, self.tools, openai_prompt)
+                agent = create_openai_tools_agent(self.llm, self.tools, OPENAI_TOOLS_PROMPT)
             
             # Create agent executor (only if not using fallback)
             if not isinstance(self.llm, FallbackLLMWrapper):
-                agent_executor = AgentExecutor(
+                executor_class = ParallelAgentExecutor if PARALLEL_EXECUTOR_SUPPORTED else AgentExecutor
+                agent_executor = executor_class(
                     agent=agent,
                     tools=self.tools,
                     verbose=True,
@@ -636,43 +860,144 @@ Final Answer: the final answer to the original input question
             return agent_executor
             
         except Exception as e:
-            logger.error(f"Error creating agent: {e}")
+            logger.error("Error creating agent: %s", e)
             raise
     
     def generate_response(self, user_input: str) -> str:
         """Generate a response using the LangChain agent."""
+        # Tools called during this turn share one view of the data files
+        token = _current_turn.set(_Turn(self))
         try:
             response = self.agent_executor.invoke({"input": user_input})
             return response.get("output", "I apologize, but I couldn't process your request.")
             
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
+            logger.error("Error generating response: %s", e)
             return f"I apologize, but I encountered an error: {e}. Please try again."
+        finally:
+            _current_turn.reset(token)
+    
+    async def generate_response_stream(self, user_input: str) -> AsyncIterator[str]:
+        """Generate a response, yielding the final answer's text as the LLM streams it."""
+        if not hasattr(self.agent_executor, "astream_events"):
+            yield await asyncio.to_thread(self.generate_response, user_input)
+            return
+        
+        try:
+            async for event in self.agent_executor.astream_events(
+                {"input": user_input}, version="v2", config={"run_name": "agent"}
+            ):
+                if event["event"] == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    # Tool-call chunks carry no text
+                    if content and isinstance(content, str):
+                        yield content
+        except Exception as e:
+            logger.error("Error streaming response: %s", e)
+            yield f"I apologize, but I encountered an error: {e}. Please try again."
+    
+    async def generate_responses(self, user_inputs: List[str], max_concurrency: int = 8) -> List[str]:
+        """Generate responses for several independent inputs, running the agent on them concurrently."""
+        if not hasattr(self.agent_executor, "ainvoke"):
+            # The fallback executor keeps conversation state, so answer in order
+            return await asyncio.to_thread(lambda: [self.generate_response(q) for q in user_inputs])
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def respond(user_input: str) -> str:
+            async with semaphore:
+                # Each input runs in its own task, so the turn set here is private to it
+                _current_turn.set(_Turn(self))
+                try:
+                    result = await self.agent_executor.ainvoke({"input": user_input})
+                except Exception as e:
+                    logger.error("Error generating response: %s", e)
+                    return f"I apologize, but I encountered an error: {e}. Please try again."
+                return result.get("output", "I apologize, but I couldn't process your request.")
+        
+        return list(await asyncio.gather(*(respond(user_input) for user_input in user_inputs)))
+    
+    def _data_path(self, filename: str) -> str:
+        """Get the path of a data file, joined once per filename."""
+        path = self._data_paths.get(filename)
+        if path is None:
+            path = self._data_paths[filename] = os.path.join(self.data_dir, filename)
+        return path
+    
+    def _turn(self) -> Optional[_Turn]:
+        """Get this agent's turn running in the current context, if any."""
+        turn = _current_turn.get()
+        return turn if turn is not None and turn.agent is self else None
     
     def _load_data(self, filename: str) -> List[Dict]:
-        """Load data from JSON file."""
-        file_path = os.path.join(self.data_dir, filename)
+        """Load data from JSON file, reusing the parsed data while the file is unchanged."""
+        return self._load_index(filename).data
+    
+    def _load_index(self, filename: str) -> _DataIndex:
+        """Load a data file together with its lookup indexes."""
+        turn = self._turn()
+        if turn is not None and filename in turn.indexes:
+            return turn.indexes[filename]
+        
+        file_path = self._data_path(filename)
         try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    return json.load(f)
-            else:
-                logger.warning(f"Data file {file_path} not found")
-                return []
+            data = json_store.load_json(file_path)
+        except FileNotFoundError:
+            logger.warning("Data file %s not found", file_path)
+            return _EMPTY_INDEX
         except Exception as e:
-            logger.error(f"Error loading {filename}: {e}")
-            return []
+            logger.error("Error loading %s: %s", filename, e)
+            return _EMPTY_INDEX
+        
+        # The store hands out a new object whenever the file was re-read
+        index = self._indexes.get(filename)
+        if index is None or index.data is not data:
+            index = self._indexes[filename] = _build_index(filename, data)
+        if turn is not None:
+            turn.indexes[filename] = index
+        return index
+    
+    def _invalidate_turn_data(self, filename: str):
+        """Drop a file from the current turn's data after it has been written."""
+        turn = self._turn()
+        if turn is not None:
+            turn.indexes.pop(filename, None)
+    
+    def _get_patient_by_id(self, patient_id: str) -> Optional[Dict]:
+        """Look up a patient by ID."""
+        return self._load_index("patients.json").by_id.get(patient_id)
+    
+    def _get_appointment_by_id(self, appointment_id: str) -> Optional[Dict]:
+        """Look up an appointment by ID."""
+        return self._load_index("appointments.json").by_id.get(appointment_id)
+    
+    def _find_patient_by_name(self, name: str) -> Optional[Dict]:
+        """Return the first patient whose full name contains ``name``."""
+        index = self._load_index("patients.json")
+        name_lower = name.lower()
+        for patient, full_name in zip(index.data, index.names):
+            if name_lower in full_name:
+                return patient
+        return None
+    
+    def _find_doctor_by_name(self, name: str) -> Optional[Dict]:
+        """Return the first doctor whose full name contains ``name``."""
+        index = self._load_index("doctors.json")
+        name_lower = name.lower()
+        for doctor, full_name in zip(index.data, index.names):
+            if name_lower in full_name:
+                return doctor
+        return None
     
     def _save_data(self, filename: str, data: List[Dict]):
         """Save data to JSON file."""
-        file_path = os.path.join(self.data_dir, filename)
+        file_path = self._data_path(filename)
+        self._invalidate_turn_data(filename)
         try:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=2)
-            logger.info(f"Data saved to {filename}")
+            json_store.save_json(file_path, data)
+            logger.info("Data saved to %s", filename)
         except Exception as e:
-            logger.error(f"Error saving {filename}: {e}")
+            logger.error("Error saving %s: %s", filename, e)
 
 
 class FallbackAgentExecutor:
@@ -680,15 +1005,23 @@ class FallbackAgentExecutor:
     
     def __init__(self, tools):
         self.tools = tools
-        # Import the basic scheduler agent for fallback functionality
-        try:
-            from app.agents.scheduler_agent import SchedulerAgent
-            from app.config import get_llm
-            fallback_llm = get_llm()
-            self.scheduler_agent = SchedulerAgent(llm=fallback_llm)
-        except Exception as e:
-            logger.warning(f"Could not initialize fallback scheduler agent: {e}")
-            self.scheduler_agent = None
+        # The basic scheduler agent is only created once the fallback is actually used
+        self._scheduler_agent = None
+        self._scheduler_agent_loaded = False
+    
+    @property
+    def scheduler_agent(self):
+        """Get the basic scheduler agent used for fallback functionality."""
+        if not self._scheduler_agent_loaded:
+            self._scheduler_agent_loaded = True
+            try:
+                from app.agents.scheduler_agent import SchedulerAgent
+                from app.config import get_llm
+                fallback_llm = get_llm()
+                self._scheduler_agent = SchedulerAgent(llm=fallback_llm)
+            except Exception as e:
+                logger.warning("Could not initialize fallback scheduler agent: %s", e)
+        return self._scheduler_agent
     
     def invoke(self, inputs):
         """Handle user inputs using the basic scheduler agent."""
@@ -699,7 +1032,7 @@ class FallbackAgentExecutor:
             else:
                 return {"output": "I'm currently in offline mode. Basic scheduling functionality is available through the main application."}
         except Exception as e:
-            logger.error(f"Fallback agent error: {e}")
+            logger.error("Fallback agent error: %s", e)
             return {"output": "I'm experiencing technical difficulties. Please try again or use the basic scheduler."}
 
 
@@ -716,64 +1049,99 @@ class FallbackLLMWrapper:
         
     def invoke(self, messages):
         """Mock invoke method that returns a basic response."""
-        from langchain_core.messages import AIMessage
         return AIMessage(content="I'm currently running in offline mode. I can help with basic appointment scheduling using our local system. What would you like to do?")
         
     def generate(self, messages):
         """Mock generate method."""
-        from langchain_core.outputs import LLMResult, Generation
         return LLMResult(generations=[[Generation(text="I'm here to help with appointment scheduling.")]])
 
 
+class _SimpleAIMessage:
+    """Minimal AI message that LangChain can use as a model response."""
+    
+    __slots__ = ("content", "type")
+    
+    def __init__(self, content):
+        self.content = content
+        self.type = "ai"
+
+
+# LangChain message type -> chat role; untyped messages count as user input
+_MESSAGE_ROLES = {"system": "system", "human": "user", None: "user"}
+
+
 class GeminiLangChainWrapper:
     """Wrapper to make SimpleGeminiClient compatible with LangChain."""
     
-    def __init__(self, gemini_client):
+    # Only near-deterministic requests are served from the response cache
+    CACHE_MAX_TEMPERATURE = 0.3
+    CACHE_TTL_SECONDS = 300
+    CACHE_MAX_ENTRIES = 512
+    
+    def __init__(self, gemini_client, temperature: float = 0.7):
         self.client = gemini_client
         self.model_name = "gemini-1.5-flash"
+        # Used when invoke is not given a temperature, as LangChain chat models are configured
+        self.temperature = temperature
+        # Response cache: request digest -> (expires_at, message), in LRU order
+        self._response_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    def _cache_key(self, messages: List[Dict], temperature: float, max_tokens: int) -> bytes:
+        """Digest of a request's canonical JSON form."""
+        payload = json.dumps(
+            [self.model_name, temperature, max_tokens, messages],
+            sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
     
     def invoke(self, messages, **kwargs):
         """Invoke method for LangChain compatibility."""
         # Convert LangChain messages to our format
-        converted_messages = []
-        for message in messages:
-            if hasattr(message, 'content'):
-                if hasattr(message, 'type'):
-                    role = "system" if message.type == "system" else "user" if message.type == "human" else "assistant"
-                else:
-                    role = "user"  # Default to user
-                converted_messages.append({"role": role, "content": message.content})
-            elif isinstance(message, dict):
-                converted_messages.append(message)
+        converted_messages = [
+            message if isinstance(message, dict)
+            else {"role": _MESSAGE_ROLES.get(getattr(message, 'type', None), "assistant"),
+                  "content": message.content}
+            for message in messages
+        ]
+        
+        temperature = kwargs.get('temperature', self.temperature)
+        max_tokens = kwargs.get('max_tokens', 500)
+        
+        cache_key = None
+        if temperature <= self.CACHE_MAX_TEMPERATURE:
+            cache_key = self._cache_key(converted_messages, temperature, max_tokens)
+            with self._cache_lock:
+                cached = self._response_cache.get(cache_key)
+                if cached and cached[0] > time.monotonic():
+                    self._response_cache.move_to_end(cache_key)
+                    return cached[1]
         
         try:
             response_data = self.client.create_completion(
                 model=self.model_name,
                 messages=converted_messages,
-                temperature=kwargs.get('temperature', 0.7),
-                max_tokens=kwargs.get('max_tokens', 500)
+                temperature=temperature,
+                max_tokens=max_tokens
             )
             
             # Return the content directly
-            from app.utils.simple_gemini import SimpleGeminiResponse
             response = SimpleGeminiResponse(response_data)
+            message = _SimpleAIMessage(response.choices[0].message.content)
             
-            # Create a simple response object that LangChain can use
-            class SimpleAIMessage:
-                def __init__(self, content):
-                    self.content = content
-                    self.type = "ai"
+            if cache_key is not None:
+                with self._cache_lock:
+                    self._response_cache[cache_key] = (time.monotonic() + self.CACHE_TTL_SECONDS, message)
+                    self._response_cache.move_to_end(cache_key)
+                    while len(self._response_cache) > self.CACHE_MAX_ENTRIES:
+                        self._response_cache.popitem(last=False)
             
-            return SimpleAIMessage(response.choices[0].message.content)
+            return message
             
         except Exception as e:
-            logger.error(f"Error in GeminiLangChainWrapper: {e}")
+            logger.error("Error in GeminiLangChainWrapper: %s", e)
             # Return a fallback response
-            class SimpleAIMessage:
-                def __init__(self, content):
-                    self.content = content
-                    self.type = "ai"
-            return SimpleAIMessage("I'm sorry, I'm having trouble processing your request right now. Please try again later.")
+            return _SimpleAIMessage("I'm sorry, I'm having trouble processing your request right now. Please try again later.")
 
 
 # Test functionality is available in test_agent.py
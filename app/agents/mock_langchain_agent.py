@@ -3,15 +3,129 @@ Enhanced Medical Scheduling Agent with fallback
 This version provides a robust fallback system when OpenAI API is not available.
 """
 
-import json
 import os
 import logging
-from datetime import datetime, timedelta, date
+import re
+from bisect import bisect_right
+from datetime import date
 from typing import Dict, List, Any, Optional
 
+from app.utils import json_store
+
 logger = logging.getLogger(__name__)
 
 
+def _keyword_pattern(*keywords: str):
+    """Compile keywords into one pattern that matches any of them as a substring."""
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords))
+
+
+# Intent keywords in priority order, matched as substrings of the lowercased input
+# so that inflections ("appointments", "rescheduled") still route to the same handler
+_INTENT_KEYWORDS = (
+    ("booking", ("schedule", "book", "appointment", "need to see")),
+    ("availability", ("available", "availability", "free", "open slots")),
+    ("reschedule", ("reschedule", "change", "move")),
+    ("cancel", ("cancel", "delete")),
+    ("export", ("export", "excel", "download", "report")),
+    ("insurance", ("insurance", "coverage", "policy")),
+    ("patient", ("patient", "lookup", "find", "search")),
+    ("greeting", ("hello", "hi", "help", "start")),
+)
+_INTENT_PRIORITY = {intent: priority for priority, (intent, _) in enumerate(_INTENT_KEYWORDS)}
+
+# One named group per intent inside a lookahead, so a single scan reports every
+# intent whose keyword starts at each position, including overlapping ones
+_INTENT_RE = re.compile("(?=" + "|".join(
+    f"(?P<{intent}>" + "|".join(re.escape(keyword) for keyword in keywords) + ")"
+    for intent, keywords in _INTENT_KEYWORDS
+) + ")")
+
+
+def _classify_intent(input_lower: str) -> Optional[str]:
+    """Get the highest-priority intent whose keywords occur in the input."""
+    best = None
+    for match in _INTENT_RE.finditer(input_lower):
+        intent = match.lastgroup
+        if best is None or _INTENT_PRIORITY[intent] < _INTENT_PRIORITY[best]:
+            best = intent
+            if _INTENT_PRIORITY[best] == 0:
+                break
+    return best
+
+# Specialties recognised in booking requests, in priority order
+_BOOKING_SPECIALTIES = ("cardiologist", "dermatologist", "neurologist", "orthopedist", "general", "psychiatrist")
+
+
+# (today's ordinal, date string one week later), refreshed when the day changes
+_next_week_cache = (None, None)
+
+
+def _next_week_str() -> str:
+    """Get the date one week from today as YYYY-MM-DD."""
+    global _next_week_cache
+    today = date.today().toordinal()
+    if _next_week_cache[0] != today:
+        _next_week_cache = (today, date.fromordinal(today + 7).isoformat())
+    return _next_week_cache[1]
+
+
+# Static replies
+_BOOKING_DETAILS_PROMPT = (
+    "\nTo book an appointment, please provide:\n"
+    "1. Your full name\n"
+    "2. Your preferred time slot\n"
+    "3. Your email address\n"
+    "4. Are you a new or returning patient?\n"
+)
+
+_RESCHEDULE_MESSAGE = (
+    "To reschedule your appointment, I'll need:\n"
+    "1. Your appointment ID (e.g., APT0001)\n"
+    "2. Your preferred new date\n"
+    "3. Your preferred new time\n\n"
+    "You can find your appointment ID in your confirmation email."
+)
+
+_CANCEL_MESSAGE = (
+    "To cancel your appointment, I'll need:\n"
+    "1. Your appointment ID (e.g., APT0001)\n"
+    "2. The reason for cancellation (optional)\n\n"
+    "Please note: Cancellations must be made at least 24 hours in advance."
+)
+
+_INSURANCE_MESSAGE = (
+    "I can help verify your insurance information. Please provide:\n"
+    "1. Insurance carrier name (e.g., Blue Cross, Aetna, Cigna)\n"
+    "2. Member ID number\n"
+    "3. Group number (if applicable)\n\n"
+    "This information helps us verify your coverage and benefits."
+)
+
+_WELCOME_MESSAGE = (
+    "👋 Hello! I'm your AI Medical Scheduling Assistant powered by LangChain. I can help you:\n\n"
+    "• **Schedule new appointments** with our specialists\n"
+    "• **Check doctor availability** and view open time slots\n"
+    "• **Reschedule or cancel** existing appointments\n"
+    "• **Verify insurance** information\n"
+    "• **Look up patient** records and appointment history\n"
+    "• **Export appointment data** for administrative review\n\n"
+    "What would you like to do today? 😊"
+)
+
+_HELP_MESSAGE = (
+    "I can help you with medical appointment scheduling. Here are some things you can ask:\n\n"
+    "• 'I need to schedule an appointment with a cardiologist'\n"
+    "• 'Check availability for Dr. Smith next week'\n"
+    "• 'Reschedule my appointment APT0001'\n"
+    "• 'Cancel appointment APT0002'\n"
+    "• 'Look up patient John Doe'\n"
+    "• 'Export appointments to Excel'\n"
+    "• 'Verify my insurance coverage'\n\n"
+    "How can I assist you today?"
+)
+
+
 class MockLangChainAgent:
     """Mock LangChain agent that provides rule-based responses with enhanced features."""
     
@@ -21,56 +135,57 @@ class MockLangChainAgent:
             self.data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
         else:
             self.data_dir = data_dir
+        # Data file paths keyed by filename, joined on first use
+        self._data_paths: Dict[str, str] = {}
         
-        from app.utils.calendar_manager import CalendarManager
-        from app.utils.notification_manager import NotificationManager
+        from app.utils.calendar_manager import get_calendar_manager
+        from app.utils.notification_manager import get_notification_manager
         
-        self.calendar_manager = CalendarManager(self.data_dir)
-        self.notification_manager = NotificationManager(self.data_dir)
+        # Managers are shared by all agents working on the same data directory
+        self.calendar_manager = get_calendar_manager(self.data_dir)
+        self.notification_manager = get_notification_manager(self.data_dir)
         self.conversation_state = {}
         
+        # Lookup indexes, rebuilt whenever the JSON store hands out newly loaded data
+        self._indexed_doctors = None
+        self._doctor_names: List[str] = []
+        self._doctor_specialties: List[str] = []
+        self._doctors_by_specialty: Dict[str, List[Dict]] = {}
+        self._indexed_patients = None
+        self._patient_names: List[str] = []
+        # All patient names joined by newlines, with each name's start offset
+        self._patient_names_blob = ""
+        self._patient_name_starts: List[int] = []
+        
+        # json_store stamp of appointments.json at the last export, and the exported file
+        self._last_export = None
+        
+        # Handlers for the intents recognised by _classify_intent
+        self._intent_handlers = {
+            "booking": self._handle_booking_request,
+            "availability": self._handle_availability_request,
+            "reschedule": self._handle_reschedule_request,
+            "cancel": self._handle_cancel_request,
+            "export": self._handle_export_request,
+            "insurance": self._handle_insurance_request,
+            "patient": self._handle_patient_lookup,
+        }
+        
         logger.info("MockLangChainAgent initialized with enhanced features")
     
     def generate_response(self, user_input: str) -> str:
         """Generate a rule-based response with enhanced functionality."""
         try:
-            input_lower = user_input.lower()
-            
-            # Appointment booking workflow
-            if any(word in input_lower for word in ["schedule", "book", "appointment", "need to see"]):
-                return self._handle_booking_request(user_input)
-            
-            # Check availability
-            elif any(word in input_lower for word in ["available", "availability", "free", "open slots"]):
-                return self._handle_availability_request(user_input)
-            
-            # Reschedule request
-            elif any(word in input_lower for word in ["reschedule", "change", "move"]):
-                return self._handle_reschedule_request(user_input)
-            
-            # Cancel request
-            elif any(word in input_lower for word in ["cancel", "delete"]):
-                return self._handle_cancel_request(user_input)
-            
-            # Export request
-            elif any(word in input_lower for word in ["export", "excel", "download", "report"]):
-                return self._handle_export_request(user_input)
-            
-            # Insurance validation
-            elif any(word in input_lower for word in ["insurance", "coverage", "policy"]):
-                return self._handle_insurance_request(user_input)
-            
-            # Patient lookup
-            elif any(word in input_lower for word in ["patient", "lookup", "find", "search"]):
-                return self._handle_patient_lookup(user_input)
+            intent = _classify_intent(user_input.lower())
             
             # Greeting or general help
-            elif any(word in input_lower for word in ["hello", "hi", "help", "start"]):
+            if intent == "greeting":
                 return self._get_welcome_message()
-            
-            else:
+            elif intent is None:
                 return self._get_help_message()
             
+            return self._intent_handlers[intent](user_input)
+            
         except Exception as e:
             logger.error(f"Error in generate_response: {e}")
             return f"I apologize, but I encountered an error: {e}. Please try again."
@@ -82,38 +197,33 @@ class MockLangChainAgent:
             input_lower = user_input.lower()
             
             # Look for doctor specialties
-            specialties = ["cardiologist", "dermatologist", "neurologist", "orthopedist", "general", "psychiatrist"]
             specialty = None
-            for spec in specialties:
+            for spec in _BOOKING_SPECIALTIES:
                 if spec in input_lower:
                     specialty = spec
                     break
             
             if specialty:
                 # Get available doctors
-                doctors = self._load_data("doctors.json")
-                matching_doctors = [d for d in doctors if specialty.lower() in d['specialty'].lower()]
+                matching_doctors = self._get_doctors_by_specialty(specialty)
                 
                 if matching_doctors:
                     doctor = matching_doctors[0]  # Take first match
                     
                     # Get next available date (7 days from now)
-                    next_week = (date.today() + timedelta(days=7)).strftime("%Y-%m-%d")
+                    next_week = _next_week_str()
                     available_slots = self.calendar_manager.get_available_slots(
                         doctor['doctor_id'], next_week, 30
                     )
                     
                     if available_slots:
-                        response = f"I found Dr. {doctor['first_name']} {doctor['last_name']}, a {doctor['specialty']}.\n\n"
-                        response += f"Available slots on {next_week}:\n"
-                        for slot in available_slots[:5]:
-                            response += f"• {slot}\n"
-                        response += f"\nTo book an appointment, please provide:\n"
-                        response += f"1. Your full name\n"
-                        response += f"2. Your preferred time slot\n"
-                        response += f"3. Your email address\n"
-                        response += f"4. Are you a new or returning patient?\n"
-                        return response
+                        slot_lines = "".join(f"• {slot}\n" for slot in available_slots[:5])
+                        return (
+                            f"I found Dr. {doctor['first_name']} {doctor['last_name']}, a {doctor['specialty']}.\n\n"
+                            f"Available slots on {next_week}:\n"
+                            f"{slot_lines}"
+                            f"{_BOOKING_DETAILS_PROMPT}"
+                        )
                     else:
                         return f"Dr. {doctor['first_name']} {doctor['last_name']} has no available slots on {next_week}. Would you like to check another date?"
                 else:
@@ -129,40 +239,42 @@ class MockLangChainAgent:
         """Handle availability check requests."""
         try:
             # Extract doctor name or specialty from input
-            words = user_input.lower().split()
+            input_lower = user_input.lower()
+            words = set(input_lower.split())
+            # Any input word occurring in a doctor's name, checked in one scan per doctor
+            words_pattern = _keyword_pattern(*words) if words else None
             
             # Look for doctor names or specialties
-            doctors = self._load_data("doctors.json")
+            doctors = self._load_doctors()
             
             matching_doctor = None
-            for doctor in doctors:
-                doctor_name = f"{doctor['first_name']} {doctor['last_name']}".lower()
-                if any(word in doctor_name for word in words):
+            for doctor, doctor_name, doctor_specialty in zip(doctors, self._doctor_names, self._doctor_specialties):
+                if words_pattern and words_pattern.search(doctor_name):
                     matching_doctor = doctor
                     break
-                elif doctor['specialty'].lower() in user_input.lower():
+                elif doctor_specialty in input_lower:
                     matching_doctor = doctor
                     break
             
             if matching_doctor:
                 # Check availability for next week
-                next_week = (date.today() + timedelta(days=7)).strftime("%Y-%m-%d")
+                next_week = _next_week_str()
                 available_slots = self.calendar_manager.get_available_slots(
                     matching_doctor['doctor_id'], next_week, 30
                 )
                 
-                response = f"Availability for Dr. {matching_doctor['first_name']} {matching_doctor['last_name']} ({matching_doctor['specialty']}) on {next_week}:\n\n"
-                
                 if available_slots:
-                    for slot in available_slots[:8]:
-                        response += f"• {slot}\n"
+                    slot_lines = "".join(f"• {slot}\n" for slot in available_slots[:8])
                     if len(available_slots) > 8:
-                        response += f"... and {len(available_slots) - 8} more slots available\n"
+                        slot_lines += f"... and {len(available_slots) - 8} more slots available\n"
                 else:
-                    response += "No available slots on this date.\n"
+                    slot_lines = "No available slots on this date.\n"
                 
-                response += "\nWould you like to check another date or book one of these slots?"
-                return response
+                return (
+                    f"Availability for Dr. {matching_doctor['first_name']} {matching_doctor['last_name']} ({matching_doctor['specialty']}) on {next_week}:\n\n"
+                    f"{slot_lines}"
+                    "\nWould you like to check another date or book one of these slots?"
+                )
             else:
                 return "Please specify which doctor or specialty you'd like to check availability for."
             
@@ -173,23 +285,16 @@ class MockLangChainAgent:
     def _handle_reschedule_request(self, user_input: str) -> str:
         """Handle appointment rescheduling requests."""
         # For simplicity, ask for appointment ID
-        return ("To reschedule your appointment, I'll need:\n"
-                "1. Your appointment ID (e.g., APT0001)\n"
-                "2. Your preferred new date\n"
-                "3. Your preferred new time\n\n"
-                "You can find your appointment ID in your confirmation email.")
+        return _RESCHEDULE_MESSAGE
     
     def _handle_cancel_request(self, user_input: str) -> str:
         """Handle appointment cancellation requests."""
-        return ("To cancel your appointment, I'll need:\n"
-                "1. Your appointment ID (e.g., APT0001)\n"
-                "2. The reason for cancellation (optional)\n\n"
-                "Please note: Cancellations must be made at least 24 hours in advance.")
+        return _CANCEL_MESSAGE
     
     def _handle_export_request(self, user_input: str) -> str:
         """Handle data export requests."""
         try:
-            filepath = self.calendar_manager.export_to_excel()
+            filepath = self._export_appointments()
             if filepath:
                 return f"✅ Appointment data has been exported to Excel file: {filepath}\n\nThe file contains all current appointment information for administrative review."
             else:
@@ -198,13 +303,23 @@ class MockLangChainAgent:
             logger.error(f"Error handling export request: {e}")
             return "I'm having trouble exporting the data. Please contact IT support."
     
+    def _export_appointments(self) -> str:
+        """Export appointments to Excel, reusing the last export while appointments are unchanged."""
+        try:
+            stamp = json_store.file_stamp(self._data_path("appointments.json"))
+        except OSError:
+            stamp = None
+        
+        if stamp and self._last_export and self._last_export[0] == stamp and os.path.exists(self._last_export[1]):
+            return self._last_export[1]
+        
+        filepath = self.calendar_manager.export_to_excel()
+        self._last_export = (stamp, filepath) if stamp and filepath else None
+        return filepath
+    
     def _handle_insurance_request(self, user_input: str) -> str:
         """Handle insurance-related requests."""
-        return ("I can help verify your insurance information. Please provide:\n"
-                "1. Insurance carrier name (e.g., Blue Cross, Aetna, Cigna)\n"
-                "2. Member ID number\n"
-                "3. Group number (if applicable)\n\n"
-                "This information helps us verify your coverage and benefits.")
+        return _INSURANCE_MESSAGE
     
     def _handle_patient_lookup(self, user_input: str) -> str:
         """Handle patient lookup requests."""
@@ -220,13 +335,7 @@ class MockLangChainAgent:
         
         if potential_name:
             try:
-                patients = self._load_data("patients.json")
-                matching_patients = []
-                
-                for patient in patients:
-                    full_name = f"{patient['first_name']} {patient['last_name']}".lower()
-                    if potential_name.lower() in full_name:
-                        matching_patients.append(patient)
+                matching_patients = self._find_patients_by_name(potential_name.lower())
                 
                 if matching_patients:
                     if len(matching_patients) == 1:
@@ -247,37 +356,83 @@ class MockLangChainAgent:
     
     def _get_welcome_message(self) -> str:
         """Get welcome message."""
-        return ("👋 Hello! I'm your AI Medical Scheduling Assistant powered by LangChain. I can help you:\n\n"
-                "• **Schedule new appointments** with our specialists\n"
-                "• **Check doctor availability** and view open time slots\n"
-                "• **Reschedule or cancel** existing appointments\n"
-                "• **Verify insurance** information\n"
-                "• **Look up patient** records and appointment history\n"
-                "• **Export appointment data** for administrative review\n\n"
-                "What would you like to do today? 😊")
+        return _WELCOME_MESSAGE
     
     def _get_help_message(self) -> str:
         """Get help message."""
-        return ("I can help you with medical appointment scheduling. Here are some things you can ask:\n\n"
-                "• 'I need to schedule an appointment with a cardiologist'\n"
-                "• 'Check availability for Dr. Smith next week'\n"
-                "• 'Reschedule my appointment APT0001'\n"
-                "• 'Cancel appointment APT0002'\n"
-                "• 'Look up patient John Doe'\n"
-                "• 'Export appointments to Excel'\n"
-                "• 'Verify my insurance coverage'\n\n"
-                "How can I assist you today?")
+        return _HELP_MESSAGE
+    
+    def _load_doctors(self) -> List[Dict]:
+        """Load doctors, refreshing the doctor lookup indexes if the file changed."""
+        doctors = self._load_data("doctors.json")
+        if doctors is not self._indexed_doctors:
+            self._doctor_names = [f"{d['first_name']} {d['last_name']}".lower() for d in doctors]
+            self._doctor_specialties = [d['specialty'].lower() for d in doctors]
+            self._doctors_by_specialty = {}
+            self._indexed_doctors = doctors
+        return doctors
+    
+    def _get_doctors_by_specialty(self, specialty: str) -> List[Dict]:
+        """Get the doctors whose specialty contains the given text, in file order."""
+        doctors = self._load_doctors()
+        specialty_lower = specialty.lower()
+        matching_doctors = self._doctors_by_specialty.get(specialty_lower)
+        if matching_doctors is None:
+            matching_doctors = [
+                d for d, d_specialty in zip(doctors, self._doctor_specialties)
+                if specialty_lower in d_specialty
+            ]
+            self._doctors_by_specialty[specialty_lower] = matching_doctors
+        return matching_doctors
+    
+    def _load_patients(self) -> List[Dict]:
+        """Load patients, refreshing the patient name index if the file changed."""
+        patients = self._load_data("patients.json")
+        if patients is not self._indexed_patients:
+            self._patient_names = [f"{p['first_name']} {p['last_name']}".lower() for p in patients]
+            self._patient_names_blob = "\n".join(self._patient_names)
+            starts, offset = [], 0
+            for full_name in self._patient_names:
+                starts.append(offset)
+                offset += len(full_name) + 1
+            self._patient_name_starts = starts
+            self._indexed_patients = patients
+        return patients
+    
+    def _find_patients_by_name(self, name_lower: str) -> List[Dict]:
+        """Get the patients whose full name contains the given lowercased text, in file order."""
+        patients = self._load_patients()
+        if not name_lower or "\n" in name_lower:
+            return [p for p, full_name in zip(patients, self._patient_names) if name_lower in full_name]
+        
+        # Scan all names at once with str.find; names never contain the newline separator,
+        # so each hit lies within a single name, found from its start offset
+        blob, starts = self._patient_names_blob, self._patient_name_starts
+        matching_patients = []
+        pos = blob.find(name_lower)
+        while pos != -1:
+            index = bisect_right(starts, pos) - 1
+            matching_patients.append(patients[index])
+            if index + 1 >= len(starts):
+                break
+            pos = blob.find(name_lower, starts[index + 1])
+        return matching_patients
+    
+    def _data_path(self, filename: str) -> str:
+        """Get the path of a data file, joined once per filename."""
+        path = self._data_paths.get(filename)
+        if path is None:
+            path = self._data_paths[filename] = os.path.join(self.data_dir, filename)
+        return path
     
     def _load_data(self, filename: str) -> List[Dict]:
-        """Load data from JSON file."""
-        file_path = os.path.join(self.data_dir, filename)
+        """Load data from JSON file, reusing the parsed data while the file is unchanged."""
+        file_path = self._data_path(filename)
         try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    return json.load(f)
-            else:
-                logger.warning(f"Data file {file_path} not found")
-                return []
+            return json_store.load_json(file_path)
+        except FileNotFoundError:
+            logger.warning(f"Data file {file_path} not found")
+            return []
         except Exception as e:
             logger.error(f"Error loading {filename}: {e}")
             return []
@@ -2,149 +2,513 @@
 Medical Scheduling Agent
 Handles patient interactions and appointment scheduling logic.
 """
-import json
 import os
+import sys
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Optional
+import re
+import time
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, List, Any, Optional, Optional, Set, Tuple
+
+from app.utils import json_store
+from app.utils.keyword_matcher import KeywordMatcher
 
 logger = logging.getLogger(__name__)
 
+# Data directory, resolved once at import
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Intent keywords, checked in this order (more specific intents first)
+_MODIFY_WORDS = frozenset(["cancel", "reschedule", "change", "modify", "move"])
+_SCHEDULE_WORDS = frozenset(["schedule", "book", "see doctor", "new appointment"])
+_WANT_WORDS = frozenset(["need", "want", "like"])
+_GREETING_WORDS = frozenset(["hello", "hi", "help", "start"])
+_CONFIRMATION_WORDS = frozenset(["yes", "yeah", "ok", "okay"])
+_NEGATIVE_WORDS = frozenset(["no", "nope", "nothing"])
+
+# Words that end the conversation once an appointment is confirmed
+_FAREWELL_WORDS = ("no", "nothing", "bye", "goodbye", "thanks", "thank you")
+# Appointment lookups a modification request can ask for directly, in order of precedence
+_LOOKUP_ACTIONS = ("cancel", "reschedule", "check")
+# Doctor details shown for an appointment whose doctor is not in doctors.json
+_UNKNOWN_DOCTOR = ("Unknown Doctor", "Unknown")
+
+# Phrases introducing the patient's name, in order of precedence
+_NAME_INTROS = ("my name is ", "i'm ", "i am ")
+# The same phrases at the start of a reply to the name question
+_NAME_PREFIX_RE = re.compile("|".join(map(re.escape, _NAME_INTROS)), re.IGNORECASE)
+# Words stripped from a modification request to leave the patient's name
+_LOOKUP_FILLER_WORDS = ("cancel", "reschedule", "check", "appointment", "my", "existing")
+
+# Entity keywords; when several occur, the one listed last wins
+_DATE_KEYWORDS = ("today", "tomorrow", "monday", "tuesday", "wednesday", "thursday", "friday")
+_TIME_KEYWORDS = ("morning", "afternoon", "evening", "9", "10", "11", "1", "2", "3", "4")
+_SPECIALTY_KEYWORDS = ("cardiologist", "dermatologist", "neurologist", "orthopedist",
+                       "pediatrician", "psychiatrist", "general", "family")
+
+# Common terms for specialties; the first term found in the requested specialty wins
+_SPECIALTY_TERMS = {
+    "cardiologist": "cardiology",
+    "heart doctor": "cardiology",
+    "heart": "cardiology",
+    "dermatologist": "dermatology",
+    "skin doctor": "dermatology",
+    "skin": "dermatology",
+    "general practitioner": "general practice",
+    "gp": "general practice",
+    "family doctor": "family medicine",
+    "anesthesiologist": "anesthesiology"
+}
+_SPECIALTY_TERM_MATCHER = KeywordMatcher(_SPECIALTY_TERMS)
+
+# Date and time preferences by keyword; when several occur, the one listed first wins
+_DATE_PREFERENCES = {
+    "tomorrow": "tomorrow",
+    "today": "today",
+    "next week": "next week",
+    "monday": "next Monday",
+    "tuesday": "next Tuesday",
+    "wednesday": "next Wednesday",
+    "thursday": "next Thursday",
+    "friday": "next Friday"
+}
+_TIME_PREFERENCES = {
+    "morning": "9:00 AM",
+    "afternoon": "2:00 PM",
+    "evening": "5:00 PM",
+    "noon": "12:00 PM"
+}
+_PREFERENCE_MATCHER = KeywordMatcher([*_DATE_PREFERENCES, *_TIME_PREFERENCES])
+
+# Every keyword the rule-based responses look for, matched in a single pass over the input
+_KEYWORD_MATCHER = KeywordMatcher([
+    *_MODIFY_WORDS, *_SCHEDULE_WORDS, "appointment", *_WANT_WORDS, *_GREETING_WORDS,
+    *_CONFIRMATION_WORDS, *_NEGATIVE_WORDS, *_DATE_KEYWORDS, *_TIME_KEYWORDS, *_SPECIALTY_KEYWORDS,
+    *_LOOKUP_ACTIONS, "existing", *_FAREWELL_WORDS
+])
+
+
+@lru_cache(maxsize=1024)
+def _slot_starts(start_time: str, end_time: str, duration: int) -> Tuple[int, ...]:
+    """Get the slot start times, in minutes since midnight, between two "HH:MM" times, skipping the lunch hour."""
+    if duration <= 0:
+        return ()
+    start_hour, start_minute = map(int, start_time.split(":"))
+    end_hour, end_minute = map(int, end_time.split(":"))
+    start = start_hour * 60 + start_minute
+    end = end_hour * 60 + end_minute
+    
+    # A slot must end by the end time; skip lunch break (simplified)
+    return tuple(minutes for minutes in range(start, end - duration + 1, duration)
+                 if minutes // 60 != 12)
+
+
+@lru_cache(maxsize=1024)
+def _slot_times(start_time: str, end_time: str, duration: int) -> Tuple[str, ...]:
+    """Get the slot start times between two "HH:MM" times as "HH:MM" strings."""
+    return tuple(f"{minutes // 60:02d}:{minutes % 60:02d}"
+                 for minutes in _slot_starts(start_time, end_time, duration))
+
+
+# Day names as used for the keys of a doctor's schedule, indexed by weekday()
+_DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+# The current second and its ISO timestamp, as last formatted by _now_iso
+_now_iso_cache = (0, "")
+
+
+def _now_iso() -> str:
+    """Get the local time as an ISO timestamp to the second, formatting it at most once per second."""
+    global _now_iso_cache
+    now = int(time.time())
+    second, timestamp = _now_iso_cache
+    if now != second:
+        timestamp = datetime.fromtimestamp(now).isoformat()
+        _now_iso_cache = (now, timestamp)
+    return timestamp
+
+
+@lru_cache(maxsize=1024)
+def _day_name(date: str) -> Optional[str]:
+    """Get the day name of a "YYYY-MM-DD" date, or None if the date is invalid."""
+    try:
+        return _DAY_NAMES[datetime.strptime(date, "%Y-%m-%d").weekday()]
+    except ValueError:
+        return None
+
+
+def _time_to_minutes(time_str: str) -> Optional[int]:
+    """Convert an "HH:MM" or "H:MM AM/PM" time to minutes since midnight, or None if unreadable."""
+    text = time_str.strip().upper()
+    meridiem = text[-2:]
+    if meridiem in ("AM", "PM"):
+        text = text[:-2].rstrip()
+    hour, _, minute = text.partition(":")
+    try:
+        hour, minute = int(hour), int(minute or 0)
+    except ValueError:
+        return None
+    if meridiem == "PM" and hour != 12:
+        hour += 12
+    elif meridiem == "AM" and hour == 12:
+        hour = 0
+    return hour * 60 + minute
+
+
+def _last_match(keywords, found):
+    """Get the last of the given keywords that was found, if any."""
+    for keyword in reversed(keywords):
+        if keyword in found:
+            return keyword
+    return None
+
+
+def _parse_date_time_preference(user_input: str) -> Tuple[str, str]:
+    """Get the (date, time) a patient asked for; the time defaults to 10:00 AM."""
+    found = _PREFERENCE_MATCHER.find(user_input.lower())
+    date_pref = next((value for keyword, value in _DATE_PREFERENCES.items() if keyword in found),
+                     None) or user_input.strip()
+    time_pref = next((value for keyword, value in _TIME_PREFERENCES.items() if keyword in found),
+                     "10:00 AM")
+    return date_pref, time_pref
+
+
+def _numbered_appointment_list(appointments: List[Dict]) -> str:
+    """Format appointments as a numbered list for the patient to choose from."""
+    # join() builds a list from its argument anyway, so a list comprehension is the faster input
+    return "\n".join([
+        f"{i}. {apt['appointment_id']}: {apt['date']} at {apt['time']} with {apt['doctor_name']}"
+        for i, apt in enumerate(appointments, 1)
+    ])
+
+
+class ConversationState:
+    """Progress and collected details of one scheduling conversation."""
+    
+    __slots__ = ("step", "patient_name", "patient_email", "specialty", "date_preference",
+                 "time_preference", "insurance_provider", "modification_action",
+                 "appointments_to_modify", "appointment_to_reschedule")
+    
+    def __init__(self, step: str = "initial", **details):
+        self.step = step
+        self.patient_name: Optional[str] = None
+        self.patient_email: Optional[str] = None
+        self.specialty: Optional[str] = None
+        self.date_preference: Optional[str] = None
+        self.time_preference: Optional[str] = None
+        self.insurance_provider: Optional[str] = None
+        self.modification_action: Optional[str] = None
+        self.appointments_to_modify: Optional[List[Dict]] = None
+        self.appointment_to_reschedule: Optional[Dict] = None
+        for name, value in details.items():
+            setattr(self, name, value)
+    
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "ConversationState":
+        """Build a state from the dict form, where the step is keyed "conversation_step"."""
+        details = dict(state)
+        return cls(details.pop("conversation_step", "initial"), **details)
+
 
 class SchedulerAgent:
     """Main scheduling agent that handles patient interactions."""
     
     def __init__(self, llm=None):
         self.llm = llm
-        self.data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
-        self.conversation_state = {}
+        self.data_dir = _DATA_DIR
+        # Data file paths keyed by filename, joined on first use
+        self._data_paths: Dict[str, str] = {}
+        self.conversation_state = ConversationState()
         self.current_patient = None
+        # Patient name index, rebuilt whenever patients.json is re-read
+        self._indexed_patients = None
+        self._patient_names: List[str] = []
+        self._patient_names_blob = ""
+        self._patient_name_starts: List[int] = []
+        self._patient_index_by_name: Dict[str, int] = {}
+        self._patient_name_lengths: List[int] = []
+        self._patient_index_by_first_last: Dict[Tuple[str, str], int] = {}
+        self._patient_index_by_email: Dict[str, int] = {}
+        # Appointment indexes, rebuilt whenever appointments.json is re-read
+        self._indexed_appointments = None
+        self._appointment_patient_names: List[str] = []
+        self._appointment_index_by_id: Dict[str, int] = {}
+        # Doctor indexes, rebuilt whenever doctors.json is re-read
+        self._indexed_doctors = None
+        self._doctors_by_id: Dict[str, Dict] = {}
+        self._doctor_labels: Dict[str, Tuple[str, str]] = {}
+        self._doctor_specialties: List[str] = []
+        self._doctor_indices_by_specialty: Dict[str, List[int]] = {}
         logger.info("SchedulerAgent initialized")
     
-    def load_data(self, filename: str) -> List[Dict]:
-        """Load data from JSON file."""
-        file_path = os.path.join(self.data_dir, filename)
+    def load_data(self, filename: str, mutable: bool = False) -> List[Dict]:
+        """
+        Load data from JSON file.
+        
+        By default the parsed data is reused while the file is unchanged; that list is
+        shared and must not be mutated. With mutable=True the caller gets its own copy,
+        freshly parsed, to modify and save back.
+        """
+        return self._load(filename, json_store.read_json if mutable else json_store.load_json)
+    
+    def _data_path(self, filename: str) -> str:
+        """Get the path of a data file, joined once per filename."""
+        path = self._data_paths.get(filename)
+        if path is None:
+            path = self._data_paths[filename] = os.path.join(self.data_dir, filename)
+        return path
+    
+    def _load(self, filename: str, reader) -> List[Dict]:
+        """Load a JSON data file with the given json_store reader."""
+        file_path = self._data_path(filename)
         try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    return json.load(f)
-            else:
-                logger.warning(f"Data file {file_path} not found")
-                return []
+            return reader(file_path)
+        except FileNotFoundError:
+            logger.warning("Data file %s not found", file_path)
+            return []
         except Exception as e:
-            logger.error(f"Error loading {filename}: {e}")
+            logger.error("Error loading %s: %s", filename, e)
             return []
     
+    def append_data(self, filename: str, record: Dict):
+        """Append a record to a JSON data file without rewriting the whole file."""
+        file_path = self._data_path(filename)
+        try:
+            json_store.append_json(file_path, record)
+            logger.info("Record appended to %s", filename)
+        except Exception as e:
+            logger.error("Error appending to %s: %s", filename, e)
+    
+    def update_data(self, filename: str, key_field: str, key_value: Any, changes: Dict):
+        """Update fields of the first record with the given key without rewriting the whole file."""
+        file_path = self._data_path(filename)
+        try:
+            json_store.update_json(file_path, key_field, key_value, changes)
+            logger.info("Record updated in %s", filename)
+        except Exception as e:
+            logger.error("Error updating %s: %s", filename, e)
+    
     def save_data(self, filename: str, data: List[Dict]):
-        """Save data to JSON file."""
-        file_path = os.path.join(self.data_dir, filename)
+        """
+        Save data to JSON file; the saved list becomes the cached copy and must not be mutated.
+        
+        Data loaded with mutable=True must be loaded and saved inside
+        json_store.write_lock, or records journaled in between are lost.
+        """
+        file_path = self._data_path(filename)
         try:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=2)
-            logger.info(f"Data saved to {filename}")
+            json_store.save_json(file_path, data)
+            logger.info("Data saved to %s", filename)
         except Exception as e:
-            logger.error(f"Error saving {filename}: {e}")
+            logger.error("Error saving %s: %s", filename, e)
     
-    def find_patient(self, name: str) -> Optional[Dict]:
-        """Find a patient by name."""
+    def _load_patients(self) -> List[Dict]:
+        """Load patients, refreshing the patient indexes if the file changed."""
         patients = self.load_data("patients.json")
+        if patients is not self._indexed_patients:
+            names = [f"{p['first_name']} {p['last_name']}".lower() for p in patients]
+            starts, offset = [], 0
+            index_by_name: Dict[str, int] = {}
+            index_by_first_last: Dict[Tuple[str, str], int] = {}
+            index_by_email: Dict[str, int] = {}
+            for index, (patient, full_name) in enumerate(zip(patients, names)):
+                starts.append(offset)
+                offset += len(full_name) + 1
+                index_by_name.setdefault(full_name, index)
+                first_last = (patient["first_name"].lower(), patient["last_name"].lower())
+                index_by_first_last.setdefault(first_last, index)
+                index_by_email.setdefault((patient.get("email") or "").lower(), index)
+            self._patient_names = names
+            self._patient_names_blob = "\n".join(names)
+            self._patient_name_starts = starts
+            self._patient_index_by_name = index_by_name
+            self._patient_name_lengths = sorted({len(full_name) for full_name in names})
+            self._patient_index_by_first_last = index_by_first_last
+            self._patient_index_by_email = index_by_email
+            self._indexed_patients = patients
+        return patients
+    
+    def find_patient(self, name: str) -> Optional[Dict]:
+        """Find the first patient whose full name contains, or is contained in, the given name."""
+        patients = self._load_patients()
+        if not patients:
+            return None
         name_lower = name.lower()
+        if "\n" in name_lower:
+            for patient, full_name in zip(patients, self._patient_names):
+                if name_lower in full_name or full_name in name_lower:
+                    return patient
+            return None
+        
+        # First name containing the query: one str.find over all names, which never
+        # contain the newline separator, so a hit lies within a single name
+        pos = self._patient_names_blob.find(name_lower)
+        best = bisect_right(self._patient_name_starts, pos) - 1 if pos != -1 else len(patients)
+        
+        # First name contained in the query: look up the query's substrings of each name length
+        index_by_name = self._patient_index_by_name
+        for length in self._patient_name_lengths:
+            if length > len(name_lower):
+                break
+            for start in range(len(name_lower) - length + 1):
+                index = index_by_name.get(name_lower[start:start + length])
+                if index is not None and index < best:
+                    best = index
         
-        for patient in patients:
-            full_name = f"{patient['first_name']} {patient['last_name']}".lower()
-            if name_lower in full_name or full_name in name_lower:
-                return patient
-        return None
+        return patients[best] if best < len(patients) else None
+    
+    def _load_appointments(self) -> List[Dict]:
+        """Load appointments, refreshing the appointment indexes if the file changed."""
+        appointments = self.load_data("appointments.json")
+        if appointments is not self._indexed_appointments:
+            self._appointment_patient_names = [a.get("patient_name", "").lower() for a in appointments]
+            index_by_id: Dict[str, int] = {}
+            for index, appointment in enumerate(appointments):
+                index_by_id.setdefault(appointment["appointment_id"], index)
+            self._appointment_index_by_id = index_by_id
+            self._indexed_appointments = appointments
+        return appointments
+    
+    def _load_doctors(self) -> List[Dict]:
+        """Load doctors, refreshing the doctor indexes if the file changed."""
+        doctors = self.load_data("doctors.json")
+        if doctors is not self._indexed_doctors:
+            by_id: Dict[str, Dict] = {}
+            # Lowercased once per load; interned since many doctors share a specialty
+            specialties = [sys.intern(d.get('specialty', '').lower()) for d in doctors]
+            indices_by_specialty: Dict[str, List[int]] = {}
+            for index, (doctor, specialty) in enumerate(zip(doctors, specialties)):
+                by_id.setdefault(doctor['doctor_id'], doctor)
+                indices_by_specialty.setdefault(specialty, []).append(index)
+            self._doctors_by_id = by_id
+            # (display name, specialty) shown when listing a patient's appointments
+            self._doctor_labels = {
+                doctor_id: (f"Dr. {d['first_name']} {d['last_name']}", d.get("specialty", "Unknown"))
+                for doctor_id, d in by_id.items()
+            }
+            self._doctor_specialties = specialties
+            self._doctor_indices_by_specialty = indices_by_specialty
+            self._indexed_doctors = doctors
+        return doctors
     
     def get_available_doctors(self, specialty: str = None) -> List[Dict]:
         """Get available doctors, optionally filtered by specialty."""
-        doctors = self.load_data("doctors.json")
+        doctors = self._load_doctors()
         if specialty:
+            # Match against each distinct specialty once, then keep the doctors in file order
             specialty_lower = specialty.lower()
-            return [d for d in doctors if specialty_lower in d['specialty'].lower()]
-        return doctors
+            groups = [indices for name, indices in self._doctor_indices_by_specialty.items()
+                      if specialty_lower in name]
+            if len(groups) == 1:
+                return [doctors[i] for i in groups[0]]
+            return [doctors[i] for i in sorted(chain.from_iterable(groups))]
+        return list(doctors)
     
     def get_available_slots(self, doctor_id: str, date: str, duration: int = 30) -> List[str]:
-        """Get available time slots for a doctor on a specific date."""
-        # This is a simplified implementation
-        # In a real system, this would check against existing appointments
-        doctors = self.load_data("doctors.json")
-        doctor = next((d for d in doctors if d['doctor_id'] == doctor_id), None)
+        """Get the time slots for a doctor on a specific date that no scheduled appointment overlaps."""
+        self._load_doctors()
+        doctor = self._doctors_by_id.get(doctor_id)
         
         if not doctor:
             return []
         
-        # Get the day of week
-        try:
-            date_obj = datetime.strptime(date, "%Y-%m-%d")
-            day_name = date_obj.strftime("%A")
-        except ValueError:
-            return []
-        
+        # Get the day of week; dates repeat across calls, so parsing is memoized
+        day_name = _day_name(date)
         if day_name not in doctor['schedule']:
             return []
         
+        # Slot times depend only on the working hours and duration, so they are generated once
         schedule = doctor['schedule'][day_name]
-        start_time = datetime.strptime(schedule['start_time'], "%H:%M")
-        end_time = datetime.strptime(schedule['end_time'], "%H:%M")
-        
-        # Generate time slots
-        slots = []
-        current_time = start_time
-        while current_time + timedelta(minutes=duration) <= end_time:
-            # Skip lunch break (simplified)
-            if not (current_time.hour == 12):
-                slots.append(current_time.strftime("%H:%M"))
-            current_time += timedelta(minutes=duration)
-        
-        return slots
+        times = _slot_times(schedule['start_time'], schedule['end_time'], duration)
+        
+        # Busy intervals (start, end) in minutes, from the doctor's scheduled appointments that day
+        busy = []
+        for appointment in self.load_data("appointments.json"):
+            if (appointment.get("doctor_id") != doctor_id or appointment.get("date") != date
+                    or appointment.get("status") != "scheduled"):
+                continue
+            start = _time_to_minutes(appointment.get("time", ""))
+            if start is not None:
+                busy.append((start, start + (appointment.get("duration_minutes") or duration)))
+        if not busy:
+            return list(times)
+        busy.sort()
+        
+        # Sweep the slots and busy intervals together, both in start order
+        available = []
+        first_busy = 0
+        for slot_start, slot_time in zip(_slot_starts(schedule['start_time'], schedule['end_time'], duration), times):
+            slot_end = slot_start + duration
+            # Intervals ending by this slot's start cannot overlap it or any later slot
+            while first_busy < len(busy) and busy[first_busy][1] <= slot_start:
+                first_busy += 1
+            for index in range(first_busy, len(busy)):
+                busy_start, busy_end = busy[index]
+                if busy_start >= slot_end:
+                    available.append(slot_time)
+                    break
+                if busy_end > slot_start:
+                    break
+            else:
+                available.append(slot_time)
+        return available
     
     def book_appointment(self, patient_data: Dict, doctor_id: str, date: str, time: str) -> Dict:
         """Book an appointment."""
-        appointments = self.load_data("appointments.json")
-        
-        # Generate appointment ID
-        appointment_id = f"APT{len(appointments) + 1:04d}"
-        
-        appointment = {
-            "appointment_id": appointment_id,
-            "patient_id": patient_data.get("patient_id"),
-            "patient_name": f"{patient_data['first_name']} {patient_data['last_name']}",
-            "doctor_id": doctor_id,
-            "date": date,
-            "time": time,
-            "status": "scheduled",
-            "created_at": datetime.now().isoformat(),
-            "type": "new_patient" if patient_data.get("is_new_patient", False) else "returning_patient"
-        }
-        
-        appointments.append(appointment)
-        self.save_data("appointments.json", appointments)
+        # Count and append under the write lock, from a fresh read rather than the shared
+        # cache, so no other writer can take the same appointment ID in between
+        with json_store.write_lock(self._data_path("appointments.json")):
+            appointments = self.load_data("appointments.json", mutable=True)
+            
+            # Generate appointment ID
+            appointment_id = f"APT{len(appointments) + 1:04d}"
+            
+            appointment = {
+                "appointment_id": appointment_id,
+                "patient_id": patient_data.get("patient_id"),
+                "patient_name": f"{patient_data['first_name']} {patient_data['last_name']}",
+                "doctor_id": doctor_id,
+                "date": date,
+                "time": time,
+                "status": "scheduled",
+                "created_at": datetime.now().isoformat(),
+                "type": "new_patient" if patient_data.get("is_new_patient", False) else "returning_patient"
+            }
+            
+            # Bookings only add a record, so they go to the file's journal instead of a full rewrite
+            self.append_data("appointments.json", appointment)
         
         return appointment
     
     def _find_or_create_patient(self) -> Dict:
         """Find existing patient or create a new one from conversation state."""
-        patients = self.load_data("patients.json")
-        patient_name = self.conversation_state.get("patient_name", "")
-        patient_email = self.conversation_state.get("patient_email", "")
+        patients = self._load_patients()
+        patient_name = self.conversation_state.patient_name or ""
+        patient_email = self.conversation_state.patient_email or ""
         
         # Parse name into first and last
         name_parts = patient_name.strip().split()
         first_name = name_parts[0] if name_parts else "Unknown"
         last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else "Patient"
         
-        # Try to find existing patient by name or email
-        for patient in patients:
-            if (patient.get("first_name", "").lower() == first_name.lower() and 
-                patient.get("last_name", "").lower() == last_name.lower()) or \
-               patient.get("email", "").lower() == patient_email.lower():
-                # Update email if provided
-                if patient_email and patient.get("email") != patient_email:
-                    patient["email"] = patient_email
-                    self.save_data("patients.json", patients)
-                return patient
+        # Try to find existing patient by name or email, whichever comes first in the file
+        matches = [index for index in (
+            self._patient_index_by_first_last.get((first_name.lower(), last_name.lower())),
+            self._patient_index_by_email.get(patient_email.lower()),
+        ) if index is not None]
+        if matches:
+            index = min(matches)
+            patient = patients[index]
+            # Update email if provided, through the journal rather than saving a stale copy
+            if patient_email and patient.get("email") != patient_email:
+                self.update_data("patients.json", "patient_id", patient["patient_id"],
+                                 {"email": patient_email})
+                patient = {**patient, "email": patient_email}
+            return patient
         
         # Create new patient if not found
         new_patient_id = f"P{len(patients) + 1:04d}"
@@ -162,7 +526,7 @@ class SchedulerAgent:
                 "zip_code": ""
             },
             "insurance": {
-                "provider": self.conversation_state.get("insurance_provider", ""),
+                "provider": self.conversation_state.insurance_provider or "",
                 "policy_number": "",
                 "group_number": ""
             },
@@ -175,52 +539,37 @@ class SchedulerAgent:
             "is_new_patient": True
         }
         
-        patients.append(new_patient)
-        self.save_data("patients.json", patients)
+        self.append_data("patients.json", new_patient)
         return new_patient
     
     def _find_available_doctor(self) -> Optional[Dict]:
         """Find an available doctor based on conversation context."""
-        doctors = self.load_data("doctors.json")
-        specialty_mentioned = self.conversation_state.get("specialty", "").lower()
+        doctors = self._load_doctors()
+        specialty_mentioned = (self.conversation_state.specialty or "").lower()
         
         # If no specialty stored, try to extract from recent inputs
         if not specialty_mentioned:
             specialty_mentioned = ""
         
-        # Mapping common terms to specialties
-        specialty_mapping = {
-            "cardiologist": "cardiology",
-            "heart doctor": "cardiology", 
-            "heart": "cardiology",
-            "dermatologist": "dermatology",
-            "skin doctor": "dermatology",
-            "skin": "dermatology",
-            "general practitioner": "general practice",
-            "gp": "general practice",
-            "family doctor": "family medicine",
-            "anesthesiologist": "anesthesiology"
-        }
-        
-        # Check for specialty matches
+        # Map common terms to specialties
         target_specialty = specialty_mentioned
-        for term, spec in specialty_mapping.items():
-            if term in specialty_mentioned:
-                target_specialty = spec
-                break
+        terms_found = _SPECIALTY_TERM_MATCHER.find(specialty_mentioned)
+        if terms_found:
+            target_specialty = next(spec for term, spec in _SPECIALTY_TERMS.items() if term in terms_found)
         
-        # Find doctors matching the specialty
+        # Find the first doctor matching the specialty, checking each distinct specialty once
         if target_specialty:
-            for doctor in doctors:
-                doctor_specialty = doctor.get("specialty", "").lower()
-                if target_specialty in doctor_specialty or doctor_specialty in target_specialty:
-                    return doctor
+            matches = [indices[0] for doctor_specialty, indices in self._doctor_indices_by_specialty.items()
+                       if target_specialty in doctor_specialty or doctor_specialty in target_specialty]
+            if matches:
+                return doctors[min(matches)]
         
         # If looking for cardiologist specifically, try to find cardiology
         if "cardio" in specialty_mentioned:
-            for doctor in doctors:
-                if "cardio" in doctor.get("specialty", "").lower():
-                    return doctor
+            matches = [indices[0] for doctor_specialty, indices in self._doctor_indices_by_specialty.items()
+                       if "cardio" in doctor_specialty]
+            if matches:
+                return doctors[min(matches)]
         
         # Return first available doctor if no specialty match
         return doctors[0] if doctors else None
@@ -229,7 +578,7 @@ class SchedulerAgent:
         """Simulate sending a confirmation email."""
         email = patient_data.get("email", "")
         if email:
-            logger.info(f"[EMAIL CONFIRMATION] Sent to {email} for appointment {appointment['appointment_id']}")
+            logger.info("[EMAIL CONFIRMATION] Sent to %s for appointment %s", email, appointment['appointment_id'])
             # In a real implementation, this would send an actual email
             print(f"\n📧 Email sent to: {email}")
             print(f"Subject: Appointment Confirmation - {appointment['appointment_id']}")
@@ -239,28 +588,24 @@ class SchedulerAgent:
     
     def _handle_appointment_lookup(self, user_input: str, action: str) -> str:
         """Handle appointment lookup for modifications."""
-        appointments = self.load_data("appointments.json")
-        patients = self.load_data("patients.json")
-        doctors = self.load_data("doctors.json")
+        appointments = self._load_appointments()
+        self._load_doctors()
+        doctor_labels = self._doctor_labels
         
         # Extract name from input
         user_lower = user_input.lower()
         name_parts = []
         
         # Try to extract name (look for patterns like "my name is" or just assume the input is a name)
-        if "my name is " in user_lower:
-            name_text = user_input[user_lower.index("my name is ") + 11:].strip()
-            name_parts = name_text.split()
-        elif "i'm " in user_lower:
-            name_text = user_input[user_lower.index("i'm ") + 4:].strip()
-            name_parts = name_text.split()
-        elif "i am " in user_lower:
-            name_text = user_input[user_lower.index("i am ") + 5:].strip()
-            name_parts = name_text.split()
+        for intro in _NAME_INTROS:
+            position = user_lower.find(intro)
+            if position != -1:
+                name_parts = user_input[position + len(intro):].split()
+                break
         else:
             # Remove action words and assume the rest is a name
             clean_input = user_input
-            for word in ["cancel", "reschedule", "check", "appointment", "my", "existing"]:
+            for word in _LOOKUP_FILLER_WORDS:
                 clean_input = clean_input.replace(word, "").strip()
             name_parts = clean_input.split()
         
@@ -268,44 +613,41 @@ class SchedulerAgent:
             return "Please provide your name so I can look up your appointments."
         
         # Find patient appointments
-        patient_appointments = []
-        for appointment in appointments:
-            appointment_name = appointment.get("patient_name", "").lower()
-            if any(part.lower() in appointment_name for part in name_parts):
-                # Find doctor info
-                doctor = next((d for d in doctors if d["doctor_id"] == appointment["doctor_id"]), None)
-                appointment_info = {
-                    **appointment,
-                    "doctor_name": f"Dr. {doctor['first_name']} {doctor['last_name']}" if doctor else "Unknown Doctor",
-                    "doctor_specialty": doctor.get("specialty", "Unknown") if doctor else "Unknown"
-                }
-                patient_appointments.append(appointment_info)
-        
-        if not patient_appointments:
+        name_parts = [part.lower() for part in name_parts]
+        matches = [
+            (appointment, doctor_labels.get(appointment["doctor_id"], _UNKNOWN_DOCTOR))
+            for appointment, appointment_name in zip(appointments, self._appointment_patient_names)
+            if any(part in appointment_name for part in name_parts)
+        ]
+        
+        if not matches:
             return (f"I couldn't find any appointments for that name. "
                    f"Please make sure you've provided the correct name, or call our office at (555) 123-4567.")
         
         # Handle different actions
         if action == "check":
-            self.conversation_state = {}  # Reset conversation
+            self.conversation_state = ConversationState()  # Reset conversation
             appointment_list = "\n".join([
-                f"• {apt['appointment_id']}: {apt['date']} at {apt['time']} with {apt['doctor_name']} ({apt['doctor_specialty']}) - {apt['status'].title()}"
-                for apt in patient_appointments
+                f"• {apt['appointment_id']}: {apt['date']} at {apt['time']} with {doctor_name} ({doctor_specialty}) - {apt['status'].title()}"
+                for apt, (doctor_name, doctor_specialty) in matches
             ])
             return (f"Here are your appointments:\n\n{appointment_list}\n\n"
                    f"Is there anything else I can help you with?")
         
-        elif action == "cancel":
+        # Appointments kept in the conversation state carry their doctor's details
+        patient_appointments = [
+            {**apt, "doctor_name": doctor_name, "doctor_specialty": doctor_specialty}
+            for apt, (doctor_name, doctor_specialty) in matches
+        ]
+        
+        if action == "cancel":
             if len(patient_appointments) == 1:
                 apt = patient_appointments[0]
                 return self._cancel_appointment(apt)
             else:
-                self.conversation_state["appointments_to_modify"] = patient_appointments
-                self.conversation_state["conversation_step"] = "select_appointment_cancel"
-                appointment_list = "\n".join([
-                    f"{i+1}. {apt['appointment_id']}: {apt['date']} at {apt['time']} with {apt['doctor_name']}"
-                    for i, apt in enumerate(patient_appointments)
-                ])
+                self.conversation_state.appointments_to_modify = patient_appointments
+                self.conversation_state.step = "select_appointment_cancel"
+                appointment_list = _numbered_appointment_list(patient_appointments)
                 return (f"You have multiple appointments. Which one would you like to cancel?\n\n"
                        f"{appointment_list}\n\n"
                        f"Please enter the number of the appointment you want to cancel.")
@@ -313,18 +655,15 @@ class SchedulerAgent:
         elif action == "reschedule":
             if len(patient_appointments) == 1:
                 apt = patient_appointments[0]
-                self.conversation_state["appointment_to_reschedule"] = apt
-                self.conversation_state["conversation_step"] = "reschedule_datetime"
+                self.conversation_state.appointment_to_reschedule = apt
+                self.conversation_state.step = "reschedule_datetime"
                 return (f"I'll help you reschedule your appointment:\n"
                        f"Current: {apt['date']} at {apt['time']} with {apt['doctor_name']}\n\n"
                        f"When would you like to reschedule it to? Please provide your preferred date and time.")
             else:
-                self.conversation_state["appointments_to_modify"] = patient_appointments
-                self.conversation_state["conversation_step"] = "select_appointment_reschedule"
-                appointment_list = "\n".join([
-                    f"{i+1}. {apt['appointment_id']}: {apt['date']} at {apt['time']} with {apt['doctor_name']}"
-                    for i, apt in enumerate(patient_appointments)
-                ])
+                self.conversation_state.appointments_to_modify = patient_appointments
+                self.conversation_state.step = "select_appointment_reschedule"
+                appointment_list = _numbered_appointment_list(patient_appointments)
                 return (f"You have multiple appointments. Which one would you like to reschedule?\n\n"
                        f"{appointment_list}\n\n"
                        f"Please enter the number of the appointment you want to reschedule.")
@@ -333,14 +672,15 @@ class SchedulerAgent:
         """Cancel a specific appointment."""
         appointments = self.load_data("appointments.json")
         
-        # Find and update the appointment
-        for i, apt in enumerate(appointments):
+        # Find the appointment; the cancellation is journaled rather than rewriting the file
+        for apt in appointments:
             if apt["appointment_id"] == appointment["appointment_id"]:
-                appointments[i]["status"] = "cancelled"
-                appointments[i]["cancelled_at"] = datetime.now().isoformat()
-                self.save_data("appointments.json", appointments)
+                self.update_data("appointments.json", "appointment_id", apt["appointment_id"], {
+                    "status": "cancelled",
+                    "cancelled_at": datetime.now().isoformat()
+                })
                 
-                self.conversation_state = {}  # Reset conversation
+                self.conversation_state = ConversationState()  # Reset conversation
                 return (f"Your appointment has been successfully cancelled.\n\n"
                        f"Cancelled Appointment:\n"
                        f"ID: {appointment['appointment_id']}\n"
@@ -353,6 +693,10 @@ class SchedulerAgent:
     
     def analyze_user_input(self, user_input: str) -> Dict[str, Any]:
         """Analyze user input to extract intent and entities."""
+        return self._analyze_input(user_input)[0]
+    
+    def _analyze_input(self, user_input: str) -> Tuple[Dict[str, Any], Set[str]]:
+        """Analyze user input as analyze_user_input does, also returning every keyword found in it."""
         input_lower = user_input.lower().strip()
         
         analysis = {
@@ -364,52 +708,47 @@ class SchedulerAgent:
         # Handle empty input
         if not input_lower:
             analysis["intent"] = "empty"
-            return analysis
+            return analysis, set()
+        
+        found = _KEYWORD_MATCHER.find(input_lower)
         
         # Detect intent - check more specific intents first
-        if any(word in input_lower for word in ["cancel", "reschedule", "change", "modify", "move"]):
+        if not _MODIFY_WORDS.isdisjoint(found):
             analysis["intent"] = "modify_appointment"
-        elif any(word in input_lower for word in ["schedule", "book", "see doctor", "new appointment"]):
+        elif not _SCHEDULE_WORDS.isdisjoint(found):
             analysis["intent"] = "schedule_appointment"  
-        elif "appointment" in input_lower and any(word in input_lower for word in ["need", "want", "like"]):
+        elif "appointment" in found and not _WANT_WORDS.isdisjoint(found):
             # Only classify as schedule if it's clearly about scheduling
             analysis["intent"] = "schedule_appointment"
-        elif any(word in input_lower for word in ["hello", "hi", "help", "start"]):
+        elif not _GREETING_WORDS.isdisjoint(found):
             analysis["intent"] = "greeting"
-        elif any(word in input_lower for word in ["yes", "yeah", "ok", "okay"]):
+        elif not _CONFIRMATION_WORDS.isdisjoint(found):
             analysis["intent"] = "confirmation"
-        elif any(word in input_lower for word in ["no", "nope", "nothing"]):
+        elif not _NEGATIVE_WORDS.isdisjoint(found):
             analysis["intent"] = "negative"
         
         # Extract entities (simplified)
         # In a real system, you'd use NLP libraries for better entity extraction
-        
-        # Look for dates
-        date_keywords = ["today", "tomorrow", "monday", "tuesday", "wednesday", "thursday", "friday"]
-        for keyword in date_keywords:
-            if keyword in input_lower:
-                analysis["entities"]["date_preference"] = keyword
-        
-        # Look for times
-        time_keywords = ["morning", "afternoon", "evening", "9", "10", "11", "1", "2", "3", "4"]
-        for keyword in time_keywords:
-            if keyword in input_lower:
-                analysis["entities"]["time_preference"] = keyword
-        
-        # Look for specialties
-        specialties = ["cardiologist", "dermatologist", "neurologist", "orthopedist", 
-                      "pediatrician", "psychiatrist", "general", "family"]
-        for specialty in specialties:
-            if specialty in input_lower:
-                analysis["entities"]["specialty"] = specialty
-        
-        return analysis
+        for entity, keywords in (("date_preference", _DATE_KEYWORDS),
+                                 ("time_preference", _TIME_KEYWORDS),
+                                 ("specialty", _SPECIALTY_KEYWORDS)):
+            keyword = _last_match(keywords, found)
+            if keyword:
+                analysis["entities"][entity] = keyword
+        
+        return analysis, found
     
     def generate_response(self, user_input: str) -> str:
         """Generate a response to user input."""
         try:
+            # Callers may still start over with ``agent.conversation_state = {}``
+            if isinstance(self.conversation_state, dict):
+                self.conversation_state = ConversationState.from_dict(self.conversation_state)
+            
             # Analyze the input
-            analysis = self.analyze_user_input(user_input)
+            analysis, keywords = self._analyze_input(user_input)
+            # The response handlers reuse the keywords instead of searching the input again
+            analysis["keywords"] = keywords
             
             # Always use rule-based responses now to ensure consistency
             # The LLM integration can be improved later with better error handling
@@ -417,27 +756,24 @@ class SchedulerAgent:
             return response
             
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
+            logger.error("Error generating response: %s", e)
             return "I apologize, but I'm experiencing some technical difficulties. Please try again."
     
     def _generate_rule_based_response(self, user_input: str, analysis: Dict) -> str:
         """Generate rule-based responses when LLM is not available."""
         intent = analysis["intent"]
-        input_lower = user_input.lower().strip()
+        keywords = analysis["keywords"]
         
         # Handle empty input
         if intent == "empty":
             return "Please enter a message or type 'exit' to quit."
         
         # Track conversation progress
-        if "conversation_step" not in self.conversation_state:
-            self.conversation_state["conversation_step"] = "initial"
-        
-        current_step = self.conversation_state["conversation_step"]
+        current_step = self.conversation_state.step
         
         # Handle greetings or start of conversation
-        if intent == "greeting" and current_step == "initial" and "cancel" not in input_lower and "reschedule" not in input_lower:
-            self.conversation_state["conversation_step"] = "name_requested"
+        if intent == "greeting" and current_step == "initial" and "cancel" not in keywords and "reschedule" not in keywords:
+            self.conversation_state.step = "name_requested"
             return ("Hello! Welcome to our medical scheduling system. "
                    "I'm here to help you schedule an appointment. "
                    "Could you please tell me your full name?")
@@ -445,15 +781,11 @@ class SchedulerAgent:
         # Handle appointment modifications first (before other intents)
         elif intent == "modify_appointment":
             # Direct handling based on the input
-            user_lower = user_input.lower()
-            if "cancel" in user_lower:
-                return self._handle_appointment_lookup(user_input, "cancel")
-            elif "reschedule" in user_lower:
-                return self._handle_appointment_lookup(user_input, "reschedule")
-            elif "check" in user_lower:
-                return self._handle_appointment_lookup(user_input, "check")
+            action = next((action for action in _LOOKUP_ACTIONS if action in keywords), None)
+            if action:
+                return self._handle_appointment_lookup(user_input, action)
             else:
-                self.conversation_state["conversation_step"] = "modification_type"
+                self.conversation_state.step = "modification_type"
                 return ("I can help you with appointment changes. "
                        "Would you like to:\n"
                        "1. Cancel an appointment\n"
@@ -463,19 +795,16 @@ class SchedulerAgent:
         
         # Handle name collection - if not obviously an intent, treat as name
         elif current_step == "name_requested":
-            if intent not in ["schedule_appointment", "modify_appointment", "greeting"]:
+            if intent not in ("schedule_appointment", "modify_appointment", "greeting"):
                 # Assume this is a name - extract just the name part
                 name_input = user_input.strip()
                 # Remove common prefixes like "My name is"
-                if name_input.lower().startswith("my name is "):
-                    name_input = name_input[11:]
-                elif name_input.lower().startswith("i'm "):
-                    name_input = name_input[4:]
-                elif name_input.lower().startswith("i am "):
-                    name_input = name_input[5:]
+                prefix = _NAME_PREFIX_RE.match(name_input)
+                if prefix:
+                    name_input = name_input[prefix.end():]
                     
-                self.conversation_state["patient_name"] = name_input.strip()
-                self.conversation_state["conversation_step"] = "appointment_type"
+                self.conversation_state.patient_name = name_input.strip()
+                self.conversation_state.step = "appointment_type"
                 return (f"Thank you, {name_input.strip()}. "
                        "What type of doctor would you like to see? For example: "
                        "cardiologist, dermatologist, general practitioner, etc.")
@@ -485,263 +814,204 @@ class SchedulerAgent:
         
         # Handle appointment scheduling
         if intent == "schedule_appointment" or current_step == "appointment_type":
-            if "patient_name" not in self.conversation_state:
-                self.conversation_state["conversation_step"] = "name_requested"
+            if self.conversation_state.patient_name is None:
+                self.conversation_state.step = "name_requested"
                 return ("I'd be happy to help you schedule an appointment. "
                        "Could you please tell me your full name first?")
             else:
                 # Store the specialty mentioned
                 specialty = analysis["entities"].get("specialty")
                 if specialty:
-                    self.conversation_state["specialty"] = specialty
-                    self.conversation_state["conversation_step"] = "datetime_preference"
+                    self.conversation_state.specialty = specialty
+                    self.conversation_state.step = "datetime_preference"
                     return (f"Great! I'll help you find a {specialty}. "
                            "When would you prefer your appointment? "
                            "Please provide your preferred date and time.")
                 else:
                     # If no specialty mentioned yet, capture it from this input
                     if current_step == "appointment_type":
-                        self.conversation_state["specialty"] = user_input.strip()
-                        self.conversation_state["conversation_step"] = "datetime_preference"
+                        self.conversation_state.specialty = user_input.strip()
+                        self.conversation_state.step = "datetime_preference"
                         return (f"Perfect! I'll help you schedule an appointment with a {user_input.strip()}. "
                                "When would you prefer your appointment? "
                                "Please provide your preferred date and time.")
                     else:
-                        self.conversation_state["conversation_step"] = "appointment_type"
+                        self.conversation_state.step = "appointment_type"
                         return ("What type of doctor would you like to see? "
                                "We have cardiologists, dermatologists, general practitioners, "
                                "and many other specialists available.")
         
-        # Handle date/time preferences
-        elif current_step == "datetime_preference":
-            # Parse date and time from user input
-            date_time_input = user_input.lower().strip()
-            date_pref = "tomorrow"  # default
-            time_pref = "10:00 AM"  # default
-            
-            # Extract date preferences
-            if "tomorrow" in date_time_input:
-                date_pref = "tomorrow"
-            elif "today" in date_time_input:
-                date_pref = "today"
-            elif "next week" in date_time_input:
-                date_pref = "next week"
-            elif "monday" in date_time_input:
-                date_pref = "next Monday"
-            elif "tuesday" in date_time_input:
-                date_pref = "next Tuesday"
-            elif "wednesday" in date_time_input:
-                date_pref = "next Wednesday"
-            elif "thursday" in date_time_input:
-                date_pref = "next Thursday"
-            elif "friday" in date_time_input:
-                date_pref = "next Friday"
-            else:
-                date_pref = user_input.strip()
-            
-            # Extract time preferences
-            if "morning" in date_time_input:
-                time_pref = "9:00 AM"
-            elif "afternoon" in date_time_input:
-                time_pref = "2:00 PM"
-            elif "evening" in date_time_input:
-                time_pref = "5:00 PM"
-            elif "noon" in date_time_input:
-                time_pref = "12:00 PM"
-            
-            self.conversation_state["date_preference"] = date_pref
-            self.conversation_state["time_preference"] = time_pref
-            self.conversation_state["conversation_step"] = "insurance_info"
+        # Steps that take the next reply as their answer are dispatched by step
+        handler = self._STEP_HANDLERS.get(current_step)
+        if handler is not None:
+            return handler(self, user_input, analysis)
+        
+        # Default response
+        return ("I'm here to help with scheduling medical appointments. "
+               "You can ask me to schedule a new appointment, cancel an existing one, "
+               "or check available times. How can I assist you today?")
+    
+    def _handle_datetime_preference(self, user_input: str, analysis: Dict) -> str:
+        """Handle date/time preferences."""
+        date_pref, time_pref = _parse_date_time_preference(user_input)
+        
+        self.conversation_state.date_preference = date_pref
+        self.conversation_state.time_preference = time_pref
+        self.conversation_state.step = "insurance_info"
+        
+        return (f"Perfect! I'll check our availability for {date_pref} at {time_pref}. "
+               "Before I confirm your appointment, could you please provide "
+               "your insurance information? What insurance provider do you have?")
+    
+    def _handle_insurance_info(self, user_input: str, analysis: Dict) -> str:
+        """Handle insurance information."""
+        self.conversation_state.insurance_provider = user_input.strip()
+        self.conversation_state.step = "email_collection"
+        return ("Thank you for providing your insurance information. "
+               "To send you a confirmation, could you please provide your email address?")
+    
+    def _handle_email_collection(self, user_input: str, analysis: Dict) -> str:
+        """Handle email collection and book the appointment."""
+        self.conversation_state.patient_email = user_input.strip()
+        
+        # Now actually book the appointment
+        try:
+            # Find or create patient data
+            patient_data = self._find_or_create_patient()
             
-            return (f"Perfect! I'll check our availability for {date_pref} at {time_pref}. "
-                   "Before I confirm your appointment, could you please provide "
-                   "your insurance information? What insurance provider do you have?")
-        
-        # Handle insurance information
-        elif current_step == "insurance_info":
-            self.conversation_state["insurance_provider"] = user_input.strip()
-            self.conversation_state["conversation_step"] = "email_collection"
-            return ("Thank you for providing your insurance information. "
-                   "To send you a confirmation, could you please provide your email address?")
-        
-        # Handle email collection and book the appointment
-        elif current_step == "email_collection":
-            self.conversation_state["patient_email"] = user_input.strip()
+            # Find available doctor
+            doctor = self._find_available_doctor()
             
-            # Now actually book the appointment
-            try:
-                # Find or create patient data
-                patient_data = self._find_or_create_patient()
+            if doctor:
+                # Book the appointment
+                appointment = self.book_appointment(
+                    patient_data=patient_data,
+                    doctor_id=doctor["doctor_id"],
+                    date=self.conversation_state.date_preference or "tomorrow",
+                    time=self.conversation_state.time_preference or "10:00 AM"
+                )
                 
-                # Find available doctor
-                doctor = self._find_available_doctor()
+                # Send confirmation email (simulated)
+                self._send_confirmation_email(appointment, patient_data)
                 
-                if doctor:
-                    # Book the appointment
-                    appointment = self.book_appointment(
-                        patient_data=patient_data,
-                        doctor_id=doctor["doctor_id"],
-                        date=self.conversation_state.get("date_preference", "tomorrow"),
-                        time=self.conversation_state.get("time_preference", "10:00 AM")
-                    )
-                    
-                    # Send confirmation email (simulated)
-                    self._send_confirmation_email(appointment, patient_data)
-                    
-                    self.conversation_state["conversation_step"] = "confirmation"
-                    return (f"Perfect! Your appointment has been successfully booked.\n\n"
-                           f"📅 **Appointment Confirmation**\n"
-                           f"Appointment ID: {appointment['appointment_id']}\n"
-                           f"Patient: {appointment['patient_name']}\n"
-                           f"Doctor: Dr. {doctor['first_name']} {doctor['last_name']} ({doctor['specialty']})\n"
-                           f"Date & Time: {appointment['date']} at {appointment['time']}\n"
-                           f"Status: {appointment['status'].title()}\n\n"
-                           f"📧 A confirmation email has been sent to {self.conversation_state['patient_email']}\n\n"
-                           f"Is there anything else I can help you with today?")
-                else:
-                    self.conversation_state["conversation_step"] = "confirmation"
-                    return ("I apologize, but we don't have any available doctors for your requested specialty at this time. "
-                           "Please call our office at (555) 123-4567 to check alternative options. "
-                           "Is there anything else I can help you with?")
-                    
-            except Exception as e:
-                logger.error(f"Error booking appointment: {e}")
-                self.conversation_state["conversation_step"] = "confirmation"
-                return ("I apologize, but there was an error booking your appointment. "
-                       "Please call our office at (555) 123-4567 to book manually. "
-                       "Is there anything else I can help you with?")
-        
-        # Handle appointment modifications
-        elif intent == "modify_appointment":
-            self.conversation_state["conversation_step"] = "modification_type"
-            return ("I can help you with appointment changes. "
-                   "Would you like to:\n"
-                   "1. Cancel an appointment\n"
-                   "2. Reschedule an appointment\n"
-                   "3. Check your existing appointments\n\n"
-                   "Please tell me what you'd like to do and provide your name.")
-        
-        # Handle modification requests
-        elif current_step == "modification_type":
-            user_lower = user_input.lower()
-            
-            if "cancel" in user_lower:
-                self.conversation_state["modification_action"] = "cancel"
-                return self._handle_appointment_lookup(user_input, "cancel")
-            elif "reschedule" in user_lower:
-                self.conversation_state["modification_action"] = "reschedule"
-                return self._handle_appointment_lookup(user_input, "reschedule")
-            elif "check" in user_lower or "existing" in user_lower:
-                self.conversation_state["modification_action"] = "check"
-                return self._handle_appointment_lookup(user_input, "check")
+                self.conversation_state.step = "confirmation"
+                return (f"Perfect! Your appointment has been successfully booked.\n\n"
+                       f"📅 **Appointment Confirmation**\n"
+                       f"Appointment ID: {appointment['appointment_id']}\n"
+                       f"Patient: {appointment['patient_name']}\n"
+                       f"Doctor: Dr. {doctor['first_name']} {doctor['last_name']} ({doctor['specialty']})\n"
+                       f"Date & Time: {appointment['date']} at {appointment['time']}\n"
+                       f"Status: {appointment['status'].title()}\n\n"
+                       f"📧 A confirmation email has been sent to {self.conversation_state.patient_email}\n\n"
+                       f"Is there anything else I can help you with today?")
             else:
-                # Try to extract name and ask for clarification
-                return ("Please specify whether you want to cancel, reschedule, or check your appointments.")
-        
-        # Handle completion
-        elif current_step == "confirmation":
-            if intent == "negative" or any(word in input_lower for word in ["no", "nothing", "bye", "goodbye", "thanks", "thank you"]):
-                self.conversation_state = {}  # Reset for next conversation
-                return ("You're welcome! Have a great day and see you at your appointment!")
+                self.conversation_state.step = "confirmation"
+                return ("I apologize, but we don't have any available doctors for your requested specialty at this time. "
+                       "Please call our office at (555) 123-4567 to check alternative options. "
+                       "Is there anything else I can help you with?")
+                
+        except Exception as e:
+            logger.error("Error booking appointment: %s", e)
+            self.conversation_state.step = "confirmation"
+            return ("I apologize, but there was an error booking your appointment. "
+                   "Please call our office at (555) 123-4567 to book manually. "
+                   "Is there anything else I can help you with?")
+    
+    def _handle_modification_type(self, user_input: str, analysis: Dict) -> str:
+        """Handle modification requests."""
+        keywords = analysis["keywords"]
+        action = next((action for action in _LOOKUP_ACTIONS if action in keywords), None)
+        if action is None and "existing" in keywords:
+            action = "check"
+        
+        if action:
+            self.conversation_state.modification_action = action
+            return self._handle_appointment_lookup(user_input, action)
+        else:
+            # Try to extract name and ask for clarification
+            return ("Please specify whether you want to cancel, reschedule, or check your appointments.")
+    
+    def _handle_confirmation(self, user_input: str, analysis: Dict) -> str:
+        """Handle completion."""
+        if analysis["intent"] == "negative" or not analysis["keywords"].isdisjoint(_FAREWELL_WORDS):
+            self.conversation_state = ConversationState()  # Reset for next conversation
+            return ("You're welcome! Have a great day and see you at your appointment!")
+        else:
+            return ("How else can I assist you today? I can help with scheduling, "
+                   "rescheduling, or answering questions about our services.")
+    
+    def _handle_select_appointment_cancel(self, user_input: str, analysis: Dict) -> str:
+        """Handle appointment selection for cancellation."""
+        try:
+            selection = int(user_input.strip()) - 1
+            appointments_list = self.conversation_state.appointments_to_modify or []
+            if 0 <= selection < len(appointments_list):
+                return self._cancel_appointment(appointments_list[selection])
             else:
-                return ("How else can I assist you today? I can help with scheduling, "
-                       "rescheduling, or answering questions about our services.")
-        
-        # Handle appointment selection for cancellation
-        elif current_step == "select_appointment_cancel":
-            try:
-                selection = int(user_input.strip()) - 1
-                appointments_list = self.conversation_state.get("appointments_to_modify", [])
-                if 0 <= selection < len(appointments_list):
-                    return self._cancel_appointment(appointments_list[selection])
-                else:
-                    return "Please enter a valid appointment number."
-            except ValueError:
-                return "Please enter a number corresponding to the appointment you want to cancel."
-        
-        # Handle appointment selection for rescheduling  
-        elif current_step == "select_appointment_reschedule":
-            try:
-                selection = int(user_input.strip()) - 1
-                appointments_list = self.conversation_state.get("appointments_to_modify", [])
-                if 0 <= selection < len(appointments_list):
-                    apt = appointments_list[selection]
-                    self.conversation_state["appointment_to_reschedule"] = apt
-                    self.conversation_state["conversation_step"] = "reschedule_datetime"
-                    return (f"I'll help you reschedule your appointment:\n"
-                           f"Current: {apt['date']} at {apt['time']} with {apt['doctor_name']}\n\n"
-                           f"When would you like to reschedule it to? Please provide your preferred date and time.")
-                else:
-                    return "Please enter a valid appointment number."
-            except ValueError:
-                return "Please enter a number corresponding to the appointment you want to reschedule."
-        
-        # Handle rescheduling date/time
-        elif current_step == "reschedule_datetime":
-            # Parse new date and time
-            date_time_input = user_input.lower().strip()
-            new_date = "tomorrow"  # default
-            new_time = "10:00 AM"  # default
-            
-            # Extract date preferences (same logic as before)
-            if "tomorrow" in date_time_input:
-                new_date = "tomorrow"
-            elif "today" in date_time_input:
-                new_date = "today"
-            elif "next week" in date_time_input:
-                new_date = "next week"
-            elif "monday" in date_time_input:
-                new_date = "next Monday"
-            elif "tuesday" in date_time_input:
-                new_date = "next Tuesday"
-            elif "wednesday" in date_time_input:
-                new_date = "next Wednesday"
-            elif "thursday" in date_time_input:
-                new_date = "next Thursday"
-            elif "friday" in date_time_input:
-                new_date = "next Friday"
+                return "Please enter a valid appointment number."
+        except ValueError:
+            return "Please enter a number corresponding to the appointment you want to cancel."
+    
+    def _handle_select_appointment_reschedule(self, user_input: str, analysis: Dict) -> str:
+        """Handle appointment selection for rescheduling."""
+        try:
+            selection = int(user_input.strip()) - 1
+            appointments_list = self.conversation_state.appointments_to_modify or []
+            if 0 <= selection < len(appointments_list):
+                apt = appointments_list[selection]
+                self.conversation_state.appointment_to_reschedule = apt
+                self.conversation_state.step = "reschedule_datetime"
+                return (f"I'll help you reschedule your appointment:\n"
+                       f"Current: {apt['date']} at {apt['time']} with {apt['doctor_name']}\n\n"
+                       f"When would you like to reschedule it to? Please provide your preferred date and time.")
             else:
-                new_date = user_input.strip()
-            
-            # Extract time preferences
-            if "morning" in date_time_input:
-                new_time = "9:00 AM"
-            elif "afternoon" in date_time_input:
-                new_time = "2:00 PM"
-            elif "evening" in date_time_input:
-                new_time = "5:00 PM"
-            elif "noon" in date_time_input:
-                new_time = "12:00 PM"
-            
-            # Update the appointment
-            appointment_to_reschedule = self.conversation_state.get("appointment_to_reschedule")
-            if appointment_to_reschedule:
-                appointments = self.load_data("appointments.json")
-                for i, apt in enumerate(appointments):
-                    if apt["appointment_id"] == appointment_to_reschedule["appointment_id"]:
-                        old_date = apt["date"]
-                        old_time = apt["time"]
-                        appointments[i]["date"] = new_date
-                        appointments[i]["time"] = new_time
-                        appointments[i]["rescheduled_at"] = datetime.now().isoformat()
-                        self.save_data("appointments.json", appointments)
-                        
-                        self.conversation_state = {}  # Reset conversation
-                        return (f"Your appointment has been successfully rescheduled!\n\n"
-                               f"**Updated Appointment Details:**\n"
-                               f"ID: {appointment_to_reschedule['appointment_id']}\n"
-                               f"Previous: {old_date} at {old_time}\n"
-                               f"New: {new_date} at {new_time}\n"
-                               f"Doctor: {appointment_to_reschedule['doctor_name']}\n\n"
-                               f"Is there anything else I can help you with?")
+                return "Please enter a valid appointment number."
+        except ValueError:
+            return "Please enter a number corresponding to the appointment you want to reschedule."
+    
+    def _handle_reschedule_datetime(self, user_input: str, analysis: Dict) -> str:
+        """Handle rescheduling date/time."""
+        new_date, new_time = _parse_date_time_preference(user_input)
+        
+        # Update the appointment
+        appointment_to_reschedule = self.conversation_state.appointment_to_reschedule
+        if appointment_to_reschedule:
+            appointment_id = appointment_to_reschedule["appointment_id"]
+            appointments = self._load_appointments()
+            index = self._appointment_index_by_id.get(appointment_id)
+            if index is not None:
+                apt = appointments[index]
+                old_date = apt["date"]
+                old_time = apt["time"]
+                # Only the changed fields go to the file's journal instead of a full rewrite
+                self.update_data("appointments.json", "appointment_id", appointment_id, {
+                    "date": new_date,
+                    "time": new_time,
+                    "rescheduled_at": _now_iso()
+                })
                 
-            return "Sorry, I couldn't find that appointment to reschedule."
-        
-        # Default response
-        else:
-            return ("I'm here to help with scheduling medical appointments. "
-                   "You can ask me to schedule a new appointment, cancel an existing one, "
-                   "or check available times. How can I assist you today?")
+                self.conversation_state = ConversationState()  # Reset conversation
+                return (f"Your appointment has been successfully rescheduled!\n\n"
+                       f"**Updated Appointment Details:**\n"
+                       f"ID: {appointment_to_reschedule['appointment_id']}\n"
+                       f"Previous: {old_date} at {old_time}\n"
+                       f"New: {new_date} at {new_time}\n"
+                       f"Doctor: {appointment_to_reschedule['doctor_name']}\n\n"
+                       f"Is there anything else I can help you with?")
+        
+        return "Sorry, I couldn't find that appointment to reschedule."
+    
+    # Handlers for the steps that take the next reply as their answer, keyed by step
+    _STEP_HANDLERS = {
+        "datetime_preference": _handle_datetime_preference,
+        "insurance_info": _handle_insurance_info,
+        "email_collection": _handle_email_collection,
+        "modification_type": _handle_modification_type,
+        "confirmation": _handle_confirmation,
+        "select_appointment_cancel": _handle_select_appointment_cancel,
+        "select_appointment_reschedule": _handle_select_appointment_reschedule,
+        "reschedule_datetime": _handle_reschedule_datetime,
+    }
 
 
 # Test functionality is available in test_agent.py  
@@ -4,12 +4,100 @@ Handles environment variables and initializes the language model.
 """
 import os
 import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, Tuple
+
+from app.utils.keyword_matcher import KeywordMatcher
 
 logger = logging.getLogger(__name__)
 
+# Whether load_environment has run
+_environment_loaded = False
+# The API-backed (or mock) LLM returned by get_llm once no agent could be created
+_shared_llm = None
+_shared_llm_lock = threading.Lock()
+
+# The MockLLM shared by every fallback path, created on first use
+_mock_llm = None
+
+# Responses from the API-backed LLMs are reused for repeated prompts, up to this many
+PROMPT_CACHE_MAX_ENTRIES = 512
+
+# Responses keyed by (model name, canonical prompt)
+_prompt_cache: Dict[Tuple[str, str], str] = {}
+# Prompts with a request in flight, set once its response is cached or it fails
+_pending_prompts: Dict[Tuple[str, str], threading.Event] = {}
+_prompt_cache_lock = threading.Lock()
+
+
+def _canonical_prompt(prompt: str) -> str:
+    """Normalize case, whitespace and trailing punctuation so trivially different prompts share a cache entry."""
+    return " ".join(prompt.casefold().split()).rstrip(".!?")
+
+
+def _cached_completion(model_name: str, prompt: str, complete: Callable[[str], str]) -> str:
+    """
+    Get the response to a prompt from the cache, or from complete(prompt).
+
+    Concurrent calls for the same prompt are coalesced: one of them calls
+    complete() while the others wait for its response. Exceptions from
+    complete() propagate to the caller that made the call.
+    """
+    key = (model_name, _canonical_prompt(prompt))
+    response = _prompt_cache.get(key)
+    if response is not None:
+        return response
+    
+    with _prompt_cache_lock:
+        pending = _pending_prompts.get(key)
+        leader = pending is None
+        if leader:
+            pending = _pending_prompts[key] = threading.Event()
+    
+    if not leader:
+        pending.wait()
+        response = _prompt_cache.get(key)
+        if response is not None:
+            return response
+        # The shared request failed, so this caller makes its own
+        return complete(prompt)
+    
+    try:
+        response = complete(prompt)
+        if response:
+            with _prompt_cache_lock:
+                if len(_prompt_cache) >= PROMPT_CACHE_MAX_ENTRIES:
+                    _prompt_cache.clear()
+                _prompt_cache[key] = response
+        return response
+    finally:
+        with _prompt_cache_lock:
+            del _pending_prompts[key]
+        pending.set()
+
+
+# System prompt for the API-backed mock LLMs
+SYSTEM_PROMPT = """You are a helpful medical appointment scheduling assistant.
+You help patients schedule appointments, collect necessary information, and answer questions about the medical practice.
+Be professional, friendly, and efficient. Always ask for necessary information step by step.
+
+Key points:
+- New patients need 60-minute appointments
+- Returning patients need 30-minute appointments
+- Collect name, preferred date/time, doctor preference, insurance information
+- Be helpful with scheduling conflicts and alternatives"""
+# Sent first in every chat-completion request; read-only
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
 
 def load_environment():
-    """Load environment variables from .env file if available."""
+    """Load environment variables from .env file if available, once per process."""
+    global _environment_loaded
+    if _environment_loaded:
+        return
+    _environment_loaded = True
     try:
         # Try to import python-dotenv if available
         from dotenv import load_dotenv
@@ -53,7 +141,7 @@ def get_gemini_api_key():
 
 def get_preferred_provider():
     """Get the preferred AI provider from environment (gemini or openai)."""
-    # Load environment first to ensure we have the latest values
+    # Make sure the .env values are loaded
     load_environment()
     provider = os.getenv("AI_PROVIDER", "gemini").lower()
     if provider not in ["gemini", "openai"]:
@@ -122,72 +210,101 @@ def get_llm():
         except Exception as e:
             logger.warning(f"Mock LangChain agent failed: {e}")
         
-        # Fall back to direct API clients
-        if provider == "gemini":
+        # Fall back to direct API clients, which are shared since they hold no conversation
+        return _get_shared_llm(provider)
+            
+    except Exception as e:
+        logger.error(f"Error in get_llm: {e}")
+        logger.info("Using mock LLM as fallback")
+        return _get_mock_llm()
+
+
+def _get_shared_llm(provider: str):
+    """Get the shared API-backed LLM, creating it on first use."""
+    global _shared_llm
+    with _shared_llm_lock:
+        if _shared_llm is None:
+            _shared_llm = _create_api_llm(provider)
+        return _shared_llm
+
+
+def _create_api_llm(provider: str):
+    """Create an LLM wrapping a direct API client for the provider, or a MockLLM if none is available."""
+    if provider == "gemini":
+        try:
+            # Try google-generativeai package first
             try:
-                # Try google-generativeai package first
-                try:
-                    import google.generativeai as genai
-                    api_key = get_gemini_api_key()
-                    genai.configure(api_key=api_key)
-                    model = genai.GenerativeModel('gemini-1.5-flash')
-                    logger.info("Google GenerativeAI client initialized successfully")
-                    return MockLLMWithGemini(model)
-                except ImportError:
-                    # Try our simple Gemini client
-                    from app.utils.simple_gemini import SimpleGeminiClient
-                    api_key = get_gemini_api_key()
-                    client = SimpleGeminiClient(api_key)
-                    logger.info("Simple Gemini client initialized successfully")
-                    return MockLLMWithSimpleGemini(client)
-            except Exception as e:
-                logger.warning(f"Could not initialize Gemini client: {e}")
-                # Try OpenAI as fallback
-                try:
-                    from openai import OpenAI
-                    api_key = get_openai_api_key()
-                    client = OpenAI(api_key=api_key)
-                    logger.info("OpenAI client initialized successfully as fallback")
-                    return MockLLMWithOpenAI(client)
-                except Exception as e2:
-                    logger.warning(f"OpenAI fallback failed: {e2}")
-        else:  # provider == "openai"
+                import google.generativeai as genai
+                api_key = get_gemini_api_key()
+                genai.configure(api_key=api_key)
+                model = genai.GenerativeModel('gemini-1.5-flash')
+                logger.info("Google GenerativeAI client initialized successfully")
+                return MockLLMWithGemini(model)
+            except ImportError:
+                # Try our simple Gemini client
+                from app.utils.simple_gemini import SimpleGeminiClient
+                api_key = get_gemini_api_key()
+                client = SimpleGeminiClient(api_key)
+                logger.info("Simple Gemini client initialized successfully")
+                return MockLLMWithSimpleGemini(client)
+        except Exception as e:
+            logger.warning(f"Could not initialize Gemini client: {e}")
+            # Try OpenAI as fallback
             try:
                 from openai import OpenAI
                 api_key = get_openai_api_key()
                 client = OpenAI(api_key=api_key)
-                logger.info("OpenAI client initialized successfully")
+                logger.info("OpenAI client initialized successfully as fallback")
                 return MockLLMWithOpenAI(client)
-            except ImportError:
-                # Try our simple OpenAI client
-                try:
-                    from app.utils.simple_openai import SimpleOpenAIClient
-                    api_key = get_openai_api_key()
-                    client = SimpleOpenAIClient(api_key)
-                    logger.info("Simple OpenAI client initialized successfully")
-                    return MockLLMWithSimpleOpenAI(client)
-                except Exception as e:
-                    logger.warning(f"Could not initialize simple OpenAI client: {e}")
+            except Exception as e2:
+                logger.warning(f"OpenAI fallback failed: {e2}")
+    else:  # provider == "openai"
+        try:
+            from openai import OpenAI
+            api_key = get_openai_api_key()
+            client = OpenAI(api_key=api_key)
+            logger.info("OpenAI client initialized successfully")
+            return MockLLMWithOpenAI(client)
+        except ImportError:
+            # Try our simple OpenAI client
+            try:
+                from app.utils.simple_openai import SimpleOpenAIClient
+                api_key = get_openai_api_key()
+                client = SimpleOpenAIClient(api_key)
+                logger.info("Simple OpenAI client initialized successfully")
+                return MockLLMWithSimpleOpenAI(client)
             except Exception as e:
-                logger.warning(f"Could not initialize OpenAI client: {e}")
-                # Try Gemini as fallback
-                try:
-                    from app.utils.simple_gemini import SimpleGeminiClient
-                    api_key = get_gemini_api_key()
-                    client = SimpleGeminiClient(api_key)
-                    logger.info("Simple Gemini client initialized successfully as fallback")
-                    return MockLLMWithSimpleGemini(client)
-                except Exception as e2:
-                    logger.warning(f"Gemini fallback failed: {e2}")
-        
-        # Final fallback to mock LLM
-        logger.info("Falling back to mock LLM")
-        return MockLLM()
-            
-    except Exception as e:
-        logger.error(f"Error in get_llm: {e}")
-        logger.info("Using mock LLM as fallback")
-        return MockLLM()
+                logger.warning(f"Could not initialize simple OpenAI client: {e}")
+        except Exception as e:
+            logger.warning(f"Could not initialize OpenAI client: {e}")
+            # Try Gemini as fallback
+            try:
+                from app.utils.simple_gemini import SimpleGeminiClient
+                api_key = get_gemini_api_key()
+                client = SimpleGeminiClient(api_key)
+                logger.info("Simple Gemini client initialized successfully as fallback")
+                return MockLLMWithSimpleGemini(client)
+            except Exception as e2:
+                logger.warning(f"Gemini fallback failed: {e2}")
+    
+    # Final fallback to mock LLM
+    logger.info("Falling back to mock LLM")
+    return _get_mock_llm()
+
+
+def reset_llm():
+    """Forget the shared LLM and reload the environment on the next get_llm call."""
+    global _environment_loaded, _shared_llm
+    with _shared_llm_lock:
+        _shared_llm = None
+    _environment_loaded = False
+
+
+# Every keyword MockLLM answers to, matched in a single pass over the prompt
+_MOCK_KEYWORD_MATCHER = KeywordMatcher([
+    "hello", "hi", "appointment", "schedule", "book", "cancel", "doctor", "insurance",
+    "new patient", "returning patient", "existing patient"
+])
 
 
 class MockLLM:
@@ -198,32 +315,36 @@ class MockLLM:
         self.api_failed = True  # Mock LLM represents a failed API state
         logger.info("MockLLM initialized")
     
+    def generate_response_stream(self, prompt: str) -> Iterator[str]:
+        """Generate a mock response as a single chunk."""
+        yield self.generate_response(prompt)
+    
     def generate_response(self, prompt: str) -> str:
         """Generate a mock response based on the prompt."""
-        prompt_lower = prompt.lower()
+        found = _MOCK_KEYWORD_MATCHER.find(prompt.lower())
         
-        if "hello" in prompt_lower or "hi" in prompt_lower:
+        if "hello" in found or "hi" in found:
             return "Hello! I'm your medical scheduling assistant. How can I help you today?"
         
-        elif "appointment" in prompt_lower:
-            if "schedule" in prompt_lower or "book" in prompt_lower:
+        elif "appointment" in found:
+            if "schedule" in found or "book" in found:
                 return ("I'd be happy to help you schedule an appointment. "
                        "Could you please provide me with your name and preferred date/time?")
-            elif "cancel" in prompt_lower:
+            elif "cancel" in found:
                 return "I can help you cancel your appointment. Could you please provide your name and appointment details?"
         
-        elif "doctor" in prompt_lower:
+        elif "doctor" in found:
             return ("We have several doctors available. Could you tell me what type of specialist "
                    "you're looking for or if you have a preference?")
         
-        elif "insurance" in prompt_lower:
+        elif "insurance" in found:
             return "I'll need to collect your insurance information. What insurance provider do you have?"
         
-        elif "new patient" in prompt_lower:
+        elif "new patient" in found:
             return ("As a new patient, I'll need to collect some additional information from you. "
                    "New patient appointments are typically 60 minutes long.")
         
-        elif "returning patient" in prompt_lower or "existing patient" in prompt_lower:
+        elif "returning patient" in found or "existing patient" in found:
             return "Welcome back! Returning patient appointments are typically 30 minutes. When would you like to schedule?"
         
         else:
@@ -232,223 +353,289 @@ class MockLLM:
                    "or provide information about our services.")
 
 
-class MockLLMWithSimpleGemini:
+def _get_mock_llm() -> MockLLM:
+    """Get the MockLLM shared by every fallback path; it holds no state."""
+    global _mock_llm
+    if _mock_llm is None:
+        _mock_llm = MockLLM()
+    return _mock_llm
+
+
+class CircuitBreaker:
+    """
+    Calls a function, switching to a fallback while the function keeps failing.
+
+    After a failure the breaker opens for `cooldown` seconds, during which calls
+    go straight to the fallback. After that it is half-open: exactly one call
+    retries the function while the others keep getting the fallback until that
+    trial call finishes. A successful trial closes the breaker; each further
+    consecutive failure doubles the cooldown, up to `max_cooldown`.
+    """
+    
+    def __init__(self, fn: Callable, fallback: Callable, name: str,
+                 cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.fn = fn
+        self.fallback = fallback
+        self.name = name
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        # Whether the one trial call of the half-open state is in progress
+        self._trial_running = False
+        self._lock = threading.Lock()
+    
+    @property
+    def is_open(self) -> bool:
+        """Whether calls currently go straight to the fallback."""
+        return bool(self._failures) and (self._trial_running or time.monotonic() < self._open_until)
+    
+    def allow_call(self) -> bool:
+        """
+        Check whether the caller may call the function itself.
+
+        Always true while the breaker is closed. Once the cooldown has passed it
+        is true for exactly one caller, which must then report the outcome with
+        record_success or record_failure.
+        """
+        if not self._failures:
+            return True
+        with self._lock:
+            if not self._failures:
+                return True
+            if self._trial_running or time.monotonic() < self._open_until:
+                return False
+            self._trial_running = True
+            return True
+    
+    def __call__(self, *args):
+        if not self.allow_call():
+            return self.fallback(*args)
+        try:
+            result = self.fn(*args)
+        except Exception as e:
+            self.record_failure(e)
+            return self.fallback(*args)
+        self.record_success()
+        return result
+    
+    def record_failure(self, error: Exception):
+        """Open the breaker after a failed call made outside __call__."""
+        with self._lock:
+            self._failures += 1
+            delay = min(self.cooldown * 2 ** (self._failures - 1), self.max_cooldown)
+            self._open_until = time.monotonic() + delay
+            self._trial_running = False
+        logger.error(f"Error calling {self.name}: {error}")
+        logger.info(f"Using MockLLM for {self.name} requests for the next {delay:.0f}s")
+    
+    def record_success(self):
+        """Reset the failure count after a successful call made outside __call__."""
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+                self._trial_running = False
+
+
+class _APIBackedLLM(ABC):
+    """
+    Base for the mock LLMs backed by a provider API.
+
+    Subclasses implement _complete(prompt). Failed calls trip a circuit breaker
+    that answers with MockLLM until the API is retried.
+    """
+    
+    def __init__(self, api_name: str):
+        self.fallback_llm = None
+        self._breaker = CircuitBreaker(self._cached_complete, self._fallback_response, api_name)
+    
+    @property
+    def api_failed(self) -> bool:
+        """Whether requests are currently answered by the fallback MockLLM."""
+        return self._breaker.is_open
+    
+    def generate_response(self, prompt: str) -> str:
+        """Generate a response using the provider API, or MockLLM while it is failing."""
+        return self._breaker(prompt)
+    
+    def generate_response_stream(self, prompt: str) -> Iterator[str]:
+        """
+        Generate a response in chunks as the provider API returns them.
+
+        Cached responses and MockLLM replies come as a single chunk. If the API
+        fails partway through, the stream ends after the chunks already sent.
+        """
+        cached = _prompt_cache.get((self.model_name, _canonical_prompt(prompt)))
+        if cached is not None:
+            yield cached
+            return
+        if not self._breaker.allow_call():
+            yield self._fallback_response(prompt)
+            return
+        
+        chunks = []
+        try:
+            for chunk in self._stream(prompt):
+                if not chunks:
+                    # The API is answering; settle the call before the consumer can stop reading
+                    self._breaker.record_success()
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            self._breaker.record_failure(e)
+            if not chunks:
+                yield self._fallback_response(prompt)
+            return
+        if not chunks:
+            self._breaker.record_success()
+        
+        response = "".join(chunks)
+        if response:
+            with _prompt_cache_lock:
+                if len(_prompt_cache) >= PROMPT_CACHE_MAX_ENTRIES:
+                    _prompt_cache.clear()
+                _prompt_cache[(self.model_name, _canonical_prompt(prompt))] = response
+    
+    def _stream(self, prompt: str) -> Iterator[str]:
+        """Get a response from the provider API in chunks; by default, all in one."""
+        yield self._complete(prompt)
+    
+    def _cached_complete(self, prompt: str) -> str:
+        # Repeated and concurrent identical prompts share one API round trip
+        return _cached_completion(self.model_name, prompt, self._complete)
+    
+    def _fallback_response(self, prompt: str) -> str:
+        if self.fallback_llm is None:
+            self.fallback_llm = _get_mock_llm()
+        return self.fallback_llm.generate_response(prompt)
+    
+    @abstractmethod
+    def _complete(self, prompt: str) -> str:
+        """Get a response to the prompt from the provider API."""
+
+
+class MockLLMWithSimpleGemini(_APIBackedLLM):
     """Enhanced mock LLM that uses our simple Gemini client."""
     
     def __init__(self, simple_gemini_client):
+        super().__init__("simple Gemini client")
         self.client = simple_gemini_client
         self.model_name = "gemini-1.5-flash"
-        self.api_failed = False  # Track if API has failed
-        self.fallback_llm = None
         logger.info("MockLLMWithSimpleGemini initialized with simple Gemini client")
     
-    def generate_response(self, prompt: str) -> str:
-        """Generate a response using our simple Gemini client."""
-        # If API has already failed, use fallback directly
-        if self.api_failed:
-            if self.fallback_llm is None:
-                self.fallback_llm = MockLLM()
-            return self.fallback_llm.generate_response(prompt)
+    def _complete(self, prompt: str) -> str:
+        """Get a response from our simple Gemini client."""
+        from app.utils.simple_gemini import SimpleGeminiResponse
         
-        try:
-            from app.utils.simple_gemini import SimpleGeminiResponse
-            
-            system_message = """You are a helpful medical appointment scheduling assistant. 
-            You help patients schedule appointments, collect necessary information, and answer questions about the medical practice.
-            Be professional, friendly, and efficient. Always ask for necessary information step by step.
-            
-            Key points:
-            - New patients need 60-minute appointments
-            - Returning patients need 30-minute appointments  
-            - Collect name, preferred date/time, doctor preference, insurance information
-            - Be helpful with scheduling conflicts and alternatives"""
-            
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ]
-            
-            response_data = self.client.create_completion(
-                model=self.model_name,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500,
-                max_retries=3  # Add retry logic for rate limiting
-            )
-            
-            response = SimpleGeminiResponse(response_data)
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Error calling simple Gemini client: {e}")
-            # Mark API as failed to avoid repeated attempts
-            self.api_failed = True
-            # Initialize fallback if not already done
-            if self.fallback_llm is None:
-                self.fallback_llm = MockLLM()
-                logger.info("Switching to MockLLM due to API failure")
-            return self.fallback_llm.generate_response(prompt)
+        messages = [_SYSTEM_MESSAGE, {"role": "user", "content": prompt}]
+        
+        response_data = self.client.create_completion(
+            model=self.model_name,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            max_retries=3  # Add retry logic for rate limiting
+        )
+        
+        response = SimpleGeminiResponse(response_data)
+        return response.choices[0].message.content
 
 
-class MockLLMWithGemini:
+class MockLLMWithGemini(_APIBackedLLM):
     """Enhanced mock LLM that uses Google GenerativeAI when available."""
     
     def __init__(self, gemini_model):
+        super().__init__("Gemini API")
         self.model = gemini_model
         self.model_name = "gemini-1.5-flash"
-        self.api_failed = False  # Track if API has failed
-        self.fallback_llm = None
+        self._model_with_system = None
         logger.info("MockLLMWithGemini initialized with Google GenerativeAI model")
     
-    def generate_response(self, prompt: str) -> str:
-        """Generate a response using Google Gemini."""
-        # If API has already failed, use fallback directly
-        if self.api_failed:
-            if self.fallback_llm is None:
-                self.fallback_llm = MockLLM()
-            return self.fallback_llm.generate_response(prompt)
-        
-        try:
-            system_instruction = """You are a helpful medical appointment scheduling assistant. 
-            You help patients schedule appointments, collect necessary information, and answer questions about the medical practice.
-            Be professional, friendly, and efficient. Always ask for necessary information step by step.
-            
-            Key points:
-            - New patients need 60-minute appointments
-            - Returning patients need 30-minute appointments  
-            - Collect name, preferred date/time, doctor preference, insurance information
-            - Be helpful with scheduling conflicts and alternatives"""
-            
-            # Create a new model with system instruction
+    def _ensure_model(self):
+        """Create the model with the system instruction, once, on first use."""
+        if self._model_with_system is None:
             import google.generativeai as genai
-            model_with_system = genai.GenerativeModel(
+            self._model_with_system = genai.GenerativeModel(
                 'gemini-1.5-flash',
-                system_instruction=system_instruction
+                system_instruction=SYSTEM_PROMPT
             )
-            
-            response = model_with_system.generate_content(prompt)
-            return response.text
-            
-        except Exception as e:
-            logger.error(f"Error calling Gemini API: {e}")
-            # Mark API as failed to avoid repeated attempts
-            self.api_failed = True
-            # Initialize fallback if not already done
-            if self.fallback_llm is None:
-                self.fallback_llm = MockLLM()
-                logger.info("Switching to MockLLM due to API failure")
-            return self.fallback_llm.generate_response(prompt)
+    
+    def _complete(self, prompt: str) -> str:
+        """Get a response from Google Gemini."""
+        self._ensure_model()
+        response = self._model_with_system.generate_content(prompt)
+        return response.text
+    
+    def _stream(self, prompt: str) -> Iterator[str]:
+        """Get a response from Google Gemini in chunks."""
+        self._ensure_model()
+        for chunk in self._model_with_system.generate_content(prompt, stream=True):
+            yield chunk.text
 
 
-class MockLLMWithSimpleOpenAI:
+class MockLLMWithSimpleOpenAI(_APIBackedLLM):
     """Enhanced mock LLM that uses our simple OpenAI client."""
     
     def __init__(self, simple_openai_client):
+        super().__init__("simple OpenAI client")
         self.client = simple_openai_client
         self.model_name = "gpt-3.5-turbo"
-        self.api_failed = False  # Track if API has failed
-        self.fallback_llm = None
         logger.info("MockLLMWithSimpleOpenAI initialized with simple OpenAI client")
     
-    def generate_response(self, prompt: str) -> str:
-        """Generate a response using our simple OpenAI client."""
-        # If API has already failed, use fallback directly
-        if self.api_failed:
-            if self.fallback_llm is None:
-                self.fallback_llm = MockLLM()
-            return self.fallback_llm.generate_response(prompt)
+    def _complete(self, prompt: str) -> str:
+        """Get a response from our simple OpenAI client."""
+        from app.utils.simple_openai import SimpleOpenAIResponse
         
-        try:
-            from app.utils.simple_openai import SimpleOpenAIResponse
-            
-            system_message = """You are a helpful medical appointment scheduling assistant. 
-            You help patients schedule appointments, collect necessary information, and answer questions about the medical practice.
-            Be professional, friendly, and efficient. Always ask for necessary information step by step.
-            
-            Key points:
-            - New patients need 60-minute appointments
-            - Returning patients need 30-minute appointments  
-            - Collect name, preferred date/time, doctor preference, insurance information
-            - Be helpful with scheduling conflicts and alternatives"""
-            
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ]
-            
-            response_data = self.client.create_completion(
-                model=self.model_name,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            response = SimpleOpenAIResponse(response_data)
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Error calling simple OpenAI client: {e}")
-            # Mark API as failed to avoid repeated attempts
-            self.api_failed = True
-            # Initialize fallback if not already done
-            if self.fallback_llm is None:
-                self.fallback_llm = MockLLM()
-                logger.info("Switching to MockLLM due to API failure")
-            return self.fallback_llm.generate_response(prompt)
+        messages = [_SYSTEM_MESSAGE, {"role": "user", "content": prompt}]
+        
+        response_data = self.client.create_completion(
+            model=self.model_name,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500
+        )
+        
+        response = SimpleOpenAIResponse(response_data)
+        return response.choices[0].message.content
 
 
-class MockLLMWithOpenAI:
+class MockLLMWithOpenAI(_APIBackedLLM):
     """Enhanced mock LLM that uses OpenAI when available."""
     
     def __init__(self, openai_client):
+        super().__init__("OpenAI API")
         self.client = openai_client
         self.model_name = "gpt-3.5-turbo"
-        self.api_failed = False  # Track if API has failed
-        self.fallback_llm = None
         logger.info("MockLLMWithOpenAI initialized with OpenAI client")
     
-    def generate_response(self, prompt: str) -> str:
-        """Generate a response using OpenAI."""
-        # If API has already failed, use fallback directly
-        if self.api_failed:
-            if self.fallback_llm is None:
-                self.fallback_llm = MockLLM()
-            return self.fallback_llm.generate_response(prompt)
+    def _complete(self, prompt: str) -> str:
+        """Get a response from OpenAI."""
+        messages = [_SYSTEM_MESSAGE, {"role": "user", "content": prompt}]
         
-        try:
-            system_message = """You are a helpful medical appointment scheduling assistant. 
-            You help patients schedule appointments, collect necessary information, and answer questions about the medical practice.
-            Be professional, friendly, and efficient. Always ask for necessary information step by step.
-            
-            Key points:
-            - New patients need 60-minute appointments
-            - Returning patients need 30-minute appointments  
-            - Collect name, preferred date/time, doctor preference, insurance information
-            - Be helpful with scheduling conflicts and alternatives"""
-            
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ]
-            
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Error calling OpenAI API: {e}")
-            # Mark API as failed to avoid repeated attempts
-            self.api_failed = True
-            # Initialize fallback if not already done
-            if self.fallback_llm is None:
-                self.fallback_llm = MockLLM()
-                logger.info("Switching to MockLLM due to API failure")
-            return self.fallback_llm.generate_response(prompt)
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500
+        )
+        
+        return response.choices[0].message.content
+    
+    def _stream(self, prompt: str) -> Iterator[str]:
+        """Get a response from OpenAI in chunks."""
+        messages = [_SYSTEM_MESSAGE, {"role": "user", "content": prompt}]
+        
+        stream = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
+        )
+        
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 
 # Configuration constants
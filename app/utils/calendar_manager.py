@@ -3,15 +3,29 @@ Calendar Integration Module
 Simulates Calendly integration and provides calendar management functionality.
 """
 
-import json
 import os
 import logging
+import threading
+import time
 from datetime import datetime, timedelta, date
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 import pandas as pd
 
+from app.utils import json_store
+
 logger = logging.getLogger(__name__)
 
+# How long computed availability is reused for the same doctor, date and duration
+SLOT_CACHE_TTL_SECONDS = 30
+SLOT_CACHE_MAX_ENTRIES = 1024
+
+
+@lru_cache(maxsize=1024)
+def _parse_date(date_str: str) -> date:
+    """Parse a "YYYY-MM-DD" date, raising ValueError if it is invalid."""
+    return datetime.strptime(date_str, "%Y-%m-%d").date()
+
 
 class CalendarManager:
     """Manages calendar operations and scheduling logic."""
@@ -22,6 +36,8 @@ class CalendarManager:
             self.data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
         else:
             self.data_dir = data_dir
+        self.appointments_file = os.path.join(self.data_dir, "appointments.json")
+        self.doctors_file = os.path.join(self.data_dir, "doctors.json")
         
         self.business_hours = {
             "start": 9,  # 9 AM
@@ -32,13 +48,24 @@ class CalendarManager:
         
         self.working_days = [0, 1, 2, 3, 4]  # Monday to Friday
         
+        # Candidate slot times per slot step (in hours), built on first use
+        self._slot_tables: Dict[int, Tuple[str, ...]] = {}
+        
+        # Available slots keyed by (doctor_id, date, duration): (expires_at, file_stamp, slots)
+        self._slot_cache: Dict[Tuple[str, str, int], Tuple[float, Tuple[int, ...], Tuple[str, ...]]] = {}
+        self._slot_cache_lock = threading.Lock()
+        
+        # Doctors by ID, rebuilt whenever doctors.json is re-read
+        self._indexed_doctors = None
+        self._doctors_by_id: Dict[str, Dict] = {}
+        
         logger.info("CalendarManager initialized")
     
     def get_available_slots(self, doctor_id: str, date_str: str, duration_minutes: int = 30) -> List[str]:
         """Get available time slots for a doctor on a specific date."""
         try:
             # Parse date
-            target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+            target_date = _parse_date(date_str)
             
             # Check if it's a working day
             if target_date.weekday() not in self.working_days:
@@ -48,17 +75,45 @@ class CalendarManager:
             if target_date <= date.today():
                 return []
             
+            # Reuse a recent result while appointments.json is unchanged
+            key = (doctor_id, date_str, duration_minutes)
+            stamp = self._appointments_stamp()
+            now = time.monotonic()
+            cached = self._slot_cache.get(key)
+            if cached and cached[0] > now and cached[1] == stamp:
+                return list(cached[2])
+            
             # Load existing appointments
             appointments = self._load_appointments()
             
-            # Get existing appointments for this doctor and date
-            existing_appointments = [
-                apt for apt in appointments
+            # Get the times already booked for this doctor and date
+            taken = {
+                apt.get('time') for apt in appointments
                 if apt.get('doctor_id') == doctor_id and apt.get('date') == date_str
-            ]
+            }
+            
+            # Check every possible slot against the existing bookings
+            available_slots = tuple(
+                time_slot for time_slot in self._get_slot_table(max(1, duration_minutes // 60))
+                if time_slot not in taken
+            )
+            
+            with self._slot_cache_lock:
+                if len(self._slot_cache) >= SLOT_CACHE_MAX_ENTRIES:
+                    self._slot_cache.clear()
+                self._slot_cache[key] = (now + SLOT_CACHE_TTL_SECONDS, stamp, available_slots)
             
-            # Generate all possible slots
-            available_slots = []
+            return list(available_slots)
+            
+        except Exception as e:
+            logger.error(f"Error getting available slots: {e}")
+            return []
+    
+    def _get_slot_table(self, step_hours: int) -> Tuple[str, ...]:
+        """Get all possible slot times within business hours for a slot step."""
+        table = self._slot_tables.get(step_hours)
+        if table is None:
+            slots = []
             current_hour = self.business_hours["start"]
             
             while current_hour < self.business_hours["end"]:
@@ -67,73 +122,64 @@ class CalendarManager:
                     current_hour += 1
                     continue
                 
-                time_slot = f"{current_hour:02d}:00"
-                
-                # Check if slot is already booked
-                is_booked = any(
-                    apt.get('time') == time_slot for apt in existing_appointments
-                )
-                
-                if not is_booked:
-                    available_slots.append(time_slot)
+                slots.append(f"{current_hour:02d}:00")
                 
                 # Move to next slot based on duration
-                current_hour += max(1, duration_minutes // 60)
-            
-            return available_slots
+                current_hour += step_hours
             
-        except Exception as e:
-            logger.error(f"Error getting available slots: {e}")
-            return []
+            table = self._slot_tables[step_hours] = tuple(slots)
+        return table
     
     def book_slot(self, doctor_id: str, date_str: str, time_str: str, patient_data: Dict, duration_minutes: int = 30) -> Dict:
         """Book a time slot for a patient."""
         try:
-            # Validate slot is available
-            available_slots = self.get_available_slots(doctor_id, date_str, duration_minutes)
-            
-            if time_str not in available_slots:
-                return {
-                    "success": False,
-                    "message": f"Time slot {time_str} is not available on {date_str}"
-                }
-            
-            # Load existing data
-            appointments = self._load_appointments()
-            doctors = self._load_doctors()
-            
-            # Find doctor
-            doctor = next((d for d in doctors if d.get('doctor_id') == doctor_id), None)
-            if not doctor:
-                return {
-                    "success": False,
-                    "message": f"Doctor with ID {doctor_id} not found"
+            # Check, load and save under the write lock, so a concurrent booking can
+            # neither take the same slot nor be lost when this one is saved
+            with json_store.write_lock(self.appointments_file):
+                # Validate slot is available
+                available_slots = self.get_available_slots(doctor_id, date_str, duration_minutes)
+                
+                if time_str not in available_slots:
+                    return {
+                        "success": False,
+                        "message": f"Time slot {time_str} is not available on {date_str}"
+                    }
+                
+                # Load existing data
+                appointments = self._load_appointments()
+                
+                # Find doctor
+                doctor = self._find_doctor(doctor_id)
+                if not doctor:
+                    return {
+                        "success": False,
+                        "message": f"Doctor with ID {doctor_id} not found"
+                    }
+                
+                # Create appointment
+                appointment_id = f"APT{len(appointments) + 1:04d}"
+                
+                appointment = {
+                    "appointment_id": appointment_id,
+                    "patient_id": patient_data.get('patient_id'),
+                    "patient_name": patient_data.get('name', f"{patient_data.get('first_name', '')} {patient_data.get('last_name', '')}").strip(),
+                    "doctor_id": doctor_id,
+                    "doctor_name": f"Dr. {doctor['first_name']} {doctor['last_name']}",
+                    "specialty": doctor.get('specialty', 'General'),
+                    "date": date_str,
+                    "time": time_str,
+                    "duration_minutes": duration_minutes,
+                    "status": "scheduled",
+                    "type": patient_data.get('type', 'returning'),
+                    "created_at": datetime.now().isoformat(),
+                    "calendar_event_id": f"cal_event_{appointment_id}",  # Simulated Calendly ID
+                    "location": doctor.get('location', 'Main Office'),
+                    "notes": patient_data.get('notes', '')
                 }
-            
-            # Create appointment
-            appointment_id = f"APT{len(appointments) + 1:04d}"
-            
-            appointment = {
-                "appointment_id": appointment_id,
-                "patient_id": patient_data.get('patient_id'),
-                "patient_name": patient_data.get('name', f"{patient_data.get('first_name', '')} {patient_data.get('last_name', '')}").strip(),
-                "doctor_id": doctor_id,
-                "doctor_name": f"Dr. {doctor['first_name']} {doctor['last_name']}",
-                "specialty": doctor.get('specialty', 'General'),
-                "date": date_str,
-                "time": time_str,
-                "duration_minutes": duration_minutes,
-                "status": "scheduled",
-                "type": patient_data.get('type', 'returning'),
-                "created_at": datetime.now().isoformat(),
-                "calendar_event_id": f"cal_event_{appointment_id}",  # Simulated Calendly ID
-                "location": doctor.get('location', 'Main Office'),
-                "notes": patient_data.get('notes', '')
-            }
-            
-            # Save appointment
-            appointments.append(appointment)
-            self._save_appointments(appointments)
+                
+                # Save appointment
+                appointments.append(appointment)
+                self._save_appointments(appointments)
             
             # Generate calendar event (simulated)
             calendar_event = self._create_calendar_event(appointment)
@@ -155,47 +201,48 @@ class CalendarManager:
     def reschedule_appointment(self, appointment_id: str, new_date: str, new_time: str) -> Dict:
         """Reschedule an existing appointment."""
         try:
-            appointments = self._load_appointments()
-            
-            # Find appointment
-            appointment_index = None
-            for i, apt in enumerate(appointments):
-                if apt.get('appointment_id') == appointment_id:
-                    appointment_index = i
-                    break
-            
-            if appointment_index is None:
-                return {
-                    "success": False,
-                    "message": f"Appointment {appointment_id} not found"
-                }
-            
-            appointment = appointments[appointment_index]
-            
-            # Check if new slot is available
-            available_slots = self.get_available_slots(
-                appointment['doctor_id'], 
-                new_date, 
-                appointment.get('duration_minutes', 30)
-            )
-            
-            if new_time not in available_slots:
-                return {
-                    "success": False,
-                    "message": f"Time slot {new_time} is not available on {new_date}"
-                }
-            
-            # Update appointment
-            old_date = appointment['date']
-            old_time = appointment['time']
-            
-            appointment['date'] = new_date
-            appointment['time'] = new_time
-            appointment['rescheduled_at'] = datetime.now().isoformat()
-            appointment['status'] = 'rescheduled'
-            
-            appointments[appointment_index] = appointment
-            self._save_appointments(appointments)
+            with json_store.write_lock(self.appointments_file):
+                appointments = self._load_appointments()
+                
+                # Find appointment
+                appointment_index = None
+                for i, apt in enumerate(appointments):
+                    if apt.get('appointment_id') == appointment_id:
+                        appointment_index = i
+                        break
+                
+                if appointment_index is None:
+                    return {
+                        "success": False,
+                        "message": f"Appointment {appointment_id} not found"
+                    }
+                
+                appointment = appointments[appointment_index]
+                
+                # Check if new slot is available
+                available_slots = self.get_available_slots(
+                    appointment['doctor_id'], 
+                    new_date, 
+                    appointment.get('duration_minutes', 30)
+                )
+                
+                if new_time not in available_slots:
+                    return {
+                        "success": False,
+                        "message": f"Time slot {new_time} is not available on {new_date}"
+                    }
+                
+                # Update appointment
+                old_date = appointment['date']
+                old_time = appointment['time']
+                
+                appointment['date'] = new_date
+                appointment['time'] = new_time
+                appointment['rescheduled_at'] = datetime.now().isoformat()
+                appointment['status'] = 'rescheduled'
+                
+                appointments[appointment_index] = appointment
+                self._save_appointments(appointments)
             
             return {
                 "success": True,
@@ -213,29 +260,30 @@ class CalendarManager:
     def cancel_appointment(self, appointment_id: str, reason: str = "") -> Dict:
         """Cancel an existing appointment."""
         try:
-            appointments = self._load_appointments()
-            
-            # Find appointment
-            appointment_index = None
-            for i, apt in enumerate(appointments):
-                if apt.get('appointment_id') == appointment_id:
-                    appointment_index = i
-                    break
-            
-            if appointment_index is None:
-                return {
-                    "success": False,
-                    "message": f"Appointment {appointment_id} not found"
-                }
-            
-            # Update appointment status
-            appointment = appointments[appointment_index]
-            appointment['status'] = 'cancelled'
-            appointment['cancelled_at'] = datetime.now().isoformat()
-            appointment['cancellation_reason'] = reason
-            
-            appointments[appointment_index] = appointment
-            self._save_appointments(appointments)
+            with json_store.write_lock(self.appointments_file):
+                appointments = self._load_appointments()
+                
+                # Find appointment
+                appointment_index = None
+                for i, apt in enumerate(appointments):
+                    if apt.get('appointment_id') == appointment_id:
+                        appointment_index = i
+                        break
+                
+                if appointment_index is None:
+                    return {
+                        "success": False,
+                        "message": f"Appointment {appointment_id} not found"
+                    }
+                
+                # Update appointment status
+                appointment = appointments[appointment_index]
+                appointment['status'] = 'cancelled'
+                appointment['cancelled_at'] = datetime.now().isoformat()
+                appointment['cancellation_reason'] = reason
+                
+                appointments[appointment_index] = appointment
+                self._save_appointments(appointments)
             
             return {
                 "success": True,
@@ -254,10 +302,9 @@ class CalendarManager:
         """Get doctor's schedule for a date range."""
         try:
             appointments = self._load_appointments()
-            doctors = self._load_doctors()
             
             # Find doctor
-            doctor = next((d for d in doctors if d.get('doctor_id') == doctor_id), None)
+            doctor = self._find_doctor(doctor_id)
             if not doctor:
                 return {
                     "success": False,
@@ -357,38 +404,72 @@ class CalendarManager:
         
         return "\n".join(schedule_lines)
     
+    def _appointments_stamp(self) -> Tuple[int, ...]:
+        """Get the json_store stamp of the appointments file, used to validate cached slots."""
+        try:
+            return json_store.file_stamp(self.appointments_file)
+        except OSError:
+            return (0, 0, 0, 0)
+    
     def _load_appointments(self) -> List[Dict]:
         """Load appointments from file."""
-        filepath = os.path.join(self.data_dir, "appointments.json")
         try:
-            if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    return json.load(f)
+            return json_store.read_json(self.appointments_file)
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.error(f"Error loading appointments: {e}")
         return []
     
     def _save_appointments(self, appointments: List[Dict]):
         """Save appointments to file."""
-        filepath = os.path.join(self.data_dir, "appointments.json")
+        # Bookings, cancellations and reschedules all land here
+        with self._slot_cache_lock:
+            self._slot_cache.clear()
         try:
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            with open(filepath, 'w') as f:
-                json.dump(appointments, f, indent=2)
+            json_store.save_json(self.appointments_file, appointments)
             logger.info("Appointments saved successfully")
         except Exception as e:
             logger.error(f"Error saving appointments: {e}")
     
     def _load_doctors(self) -> List[Dict]:
         """Load doctors from file."""
-        filepath = os.path.join(self.data_dir, "doctors.json")
         try:
-            if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    return json.load(f)
+            # Doctors are only read here, so the shared cached copy is used
+            return json_store.load_json(self.doctors_file)
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.error(f"Error loading doctors: {e}")
         return []
+    
+    def _find_doctor(self, doctor_id: str) -> Optional[Dict]:
+        """Find a doctor by ID, refreshing the ID index if doctors.json changed."""
+        doctors = self._load_doctors()
+        if doctors is not self._indexed_doctors:
+            doctors_by_id: Dict[str, Dict] = {}
+            for doctor in doctors:
+                doctors_by_id.setdefault(doctor.get('doctor_id'), doctor)
+            self._doctors_by_id = doctors_by_id
+            self._indexed_doctors = doctors
+        return self._doctors_by_id.get(doctor_id)
+
+
+# Shared CalendarManager instances keyed by absolute data directory
+_calendar_managers: Dict[Optional[str], CalendarManager] = {}
+_calendar_managers_lock = threading.Lock()
+
+
+def get_calendar_manager(data_dir: str = None) -> CalendarManager:
+    """Get the shared CalendarManager for a data directory, creating it on first use."""
+    key = os.path.abspath(data_dir) if data_dir else None
+    manager = _calendar_managers.get(key)
+    if manager is None:
+        with _calendar_managers_lock:
+            manager = _calendar_managers.get(key)
+            if manager is None:
+                manager = _calendar_managers[key] = CalendarManager(data_dir)
+    return manager
 
 
 if __name__ == "__main__":
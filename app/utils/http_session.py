@@ -0,0 +1,68 @@
+"""
+HTTP Session
+Keep-alive HTTPS connections for the standard-library API clients.
+"""
+import io
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+
+
+class KeepAliveSession:
+    """
+    Sends requests to one HTTPS host over a persistent connection per thread.
+
+    urllib.request opens a new connection, with its own TCP and TLS handshakes,
+    for every request; this reuses it while the server keeps it open. Errors are
+    raised as urllib would raise them: urllib.error.HTTPError for error
+    statuses and urllib.error.URLError when the request cannot be sent.
+    """
+
+    def __init__(self, base_url: str):
+        parts = urllib.parse.urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_url = base_url.rstrip("/")
+        self.base_path = parts.path.rstrip("/")
+        self._local = threading.local()
+
+    def post(self, path: str, body: bytes, headers: dict, timeout: float = 30) -> bytes:
+        """POST a body to a path under the base URL and return the response body."""
+        # A reused connection may have been closed by the server while idle; that is retried once
+        for retry in (True, False):
+            connection = getattr(self._local, "connection", None)
+            reused = connection is not None
+            if connection is None:
+                connection = http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+                self._local.connection = connection
+            connection.timeout = timeout
+            try:
+                connection.request("POST", self.base_path + path, body=body, headers=headers)
+                response = connection.getresponse()
+                raw = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                self._drop(connection)
+                if retry and reused:
+                    continue
+                raise urllib.error.URLError(e)
+            except (OSError, http.client.HTTPException) as e:
+                self._drop(connection)
+                raise urllib.error.URLError(e)
+
+            if response.will_close:
+                self._drop(connection)
+            if response.status >= 400:
+                raise urllib.error.HTTPError(self.base_url + path, response.status, response.reason,
+                                             response.headers, io.BytesIO(raw))
+            return raw
+
+    def close(self):
+        """Close the calling thread's connection, if it has one."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            self._drop(connection)
+
+    def _drop(self, connection: http.client.HTTPSConnection):
+        connection.close()
+        self._local.connection = None
@@ -0,0 +1,343 @@
+"""
+JSON Data Store
+Shared read-through cache for the JSON data files used by the agents.
+
+Records can also be appended to, or updated in, a data file holding a JSON
+list through a journal: a "<file>.journal" file next to it with one JSON
+entry per line.
+Reads replay the journal over the file, and saving the whole list folds the
+journal back into the file. A data file on its own is therefore not the
+whole list: every reader, including scripts and tools outside the agents,
+must go through read_json or load_json rather than parsing the file directly.
+The ".journal" and ".lock" files are runtime state and are not checked in.
+
+Each write holds an advisory lock on "<file>.lock" (where fcntl is available)
+and a per-file thread lock. A save replaces everything journaled before it, so
+code that reads a list, changes it and saves it back must do all three inside
+write_lock; otherwise records appended in between are lost.
+"""
+
+import json
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+
+# Try to import orjson for faster JSON parsing, but make it optional
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Try to import fcntl for locking data files across processes (POSIX only), but make it optional
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+# Journals larger than this are folded back into their data file on the next append
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+# Parsed files keyed by absolute path: (file_stamp, data)
+_cache: Dict[str, Tuple[Tuple[int, int, int, int], Any]] = {}
+_lock = threading.Lock()
+# Directories already created by save_json or write_lock
+_created_dirs = set()
+# Per-file locks serializing writers within this process, keyed by absolute path
+_file_locks: Dict[str, threading.RLock] = {}
+# Paths whose lock file the current thread holds
+_held = threading.local()
+
+
+def _loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+
+
+def _journal_line(entry: Any) -> bytes:
+    # Entries start with a newline, so one torn by a crash mid-append stays on its own line
+    if ORJSON_AVAILABLE:
+        return b"\n" + orjson.dumps(entry)
+    return b"\n" + json.dumps(entry, separators=(",", ":")).encode('utf-8')
+
+
+def _ensure_dir(key: str):
+    directory = os.path.dirname(key)
+    if directory not in _created_dirs:
+        os.makedirs(directory, exist_ok=True)
+        _created_dirs.add(directory)
+
+
+@contextmanager
+def _write_lock(key: str):
+    """Hold the exclusive write lock of a data file; re-entrant within a thread."""
+    with _lock:
+        file_lock = _file_locks.get(key)
+        if file_lock is None:
+            file_lock = _file_locks[key] = threading.RLock()
+    with file_lock:
+        held = getattr(_held, "keys", None)
+        if held is None:
+            held = _held.keys = set()
+        if not FCNTL_AVAILABLE or key in held:
+            yield
+            return
+        with open(key + LOCK_SUFFIX, 'ab') as f:
+            # Closing the lock file releases the lock
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            held.add(key)
+            try:
+                yield
+            finally:
+                held.discard(key)
+
+
+@contextmanager
+def write_lock(file_path: str):
+    """
+    Hold a data file's write lock for a read-modify-write.
+
+    Inside the block, read the list with read_json and write it back with
+    save_json (or append_json/update_json); no other writer, in this process or
+    another, can change the file in between.
+    Raises OSError if the lock file cannot be created.
+    """
+    key = os.path.abspath(file_path)
+    _ensure_dir(key)
+    with _write_lock(key):
+        yield
+
+
+def file_stamp(file_path: str) -> Tuple[int, int, int, int]:
+    """
+    Get the (mtime_ns, size) of a data file followed by those of its journal.
+
+    The stamp changes whenever the data read_json would return does.
+    Raises OSError if the data file does not exist.
+    """
+    stat = os.stat(file_path)
+    try:
+        journal = os.stat(file_path + JOURNAL_SUFFIX)
+    except FileNotFoundError:
+        return (stat.st_mtime_ns, stat.st_size, 0, 0)
+    return (stat.st_mtime_ns, stat.st_size, journal.st_mtime_ns, journal.st_size)
+
+
+def load_json(file_path: str) -> Any:
+    """
+    Load a JSON file, reusing the parsed data while the file is unchanged.
+
+    The returned object is shared with every other caller and must not be mutated.
+    Raises OSError if the file cannot be read and ValueError if it is not valid JSON.
+    """
+    key = os.path.abspath(file_path)
+    stamp = file_stamp(key)
+    cached = _cache.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    data = read_json(key)
+
+    with _lock:
+        _cache[key] = (stamp, data)
+    return data
+
+
+def read_json(file_path: str) -> Any:
+    """
+    Read and parse a JSON file in one go, without caching.
+
+    Journaled records are included. The caller owns the returned object and may mutate it.
+    """
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    data = _loads(raw)
+
+    try:
+        with open(file_path + JOURNAL_SUFFIX, 'rb') as f:
+            journal = f.read()
+    except FileNotFoundError:
+        return data
+    _replay_journal(file_path, data, journal)
+    return data
+
+
+def _replay_journal(file_path: str, data: list, journal: bytes):
+    """Apply journal entries, in order, to the data read from a file."""
+    # Record positions by key value, per key field used by update entries
+    positions: Dict[str, Dict[Any, int]] = {}
+    for line in journal.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = _loads(line)
+        except ValueError:
+            logger.warning("Ignoring incomplete journal entry in %s", file_path)
+            continue
+        _apply_entry(data, entry, positions)
+
+
+def _apply_entry(data: list, entry: Dict, positions: Dict[str, Dict[Any, int]] = None,
+                 copy_records: bool = False):
+    """
+    Apply one journal entry to a list of records.
+
+    positions, if given, indexes records by key value and is kept up to date.
+    With copy_records=True, an updated record is replaced by an updated copy
+    instead of being changed in place.
+    """
+    op = entry.get("op")
+    if op == "append":
+        data.append(entry["record"])
+        if positions:
+            record = entry["record"]
+            for field, index in positions.items():
+                index.setdefault(record.get(field), len(data) - 1)
+    elif op == "update":
+        field, value = entry["key"], entry["value"]
+        if positions is None:
+            position = next((i for i, r in enumerate(data) if r.get(field) == value), None)
+        else:
+            index = positions.get(field)
+            if index is None:
+                index = positions[field] = {}
+                for i, record in enumerate(data):
+                    index.setdefault(record.get(field), i)
+            position = index.get(value)
+        if position is None:
+            return
+        if copy_records:
+            data[position] = {**data[position], **entry["changes"]}
+        else:
+            data[position].update(entry["changes"])
+
+
+def _write_entry(key: str, entry: Dict, durable: bool):
+    """Record an entry in a data file's journal, compacting the journal once it is large."""
+    with _write_lock(key):
+        before = file_stamp(key)
+        if before[3] >= JOURNAL_COMPACT_BYTES:
+            data = read_json(key)
+            _apply_entry(data, entry)
+            _save_locked(key, data, durable)
+            return
+
+        with open(key + JOURNAL_SUFFIX, 'ab') as f:
+            f.write(_journal_line(entry))
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+
+        # Still under the write lock, so the new stamp covers exactly the entries
+        # in the cached list; another process cannot append in between
+        with _lock:
+            cached = _cache.pop(key, None)
+            if cached and cached[0] == before:
+                # Keep the cache current with a new list, so holders of the old one see no change
+                data = list(cached[1])
+                _apply_entry(data, entry, copy_records=True)
+                try:
+                    _cache[key] = (file_stamp(key), data)
+                except OSError:
+                    pass
+
+
+def append_json(file_path: str, record: Any, durable: bool = False):
+    """
+    Append a record to a JSON list file without rewriting the file.
+
+    The record is written to the file's journal as a single line. Once the journal
+    has grown past JOURNAL_COMPACT_BYTES, the whole list is saved back instead.
+    With durable=True the write is flushed to disk before returning.
+    Raises OSError if the file cannot be written.
+    """
+    key = os.path.abspath(file_path)
+    try:
+        _write_entry(key, {"op": "append", "record": record}, durable)
+    except FileNotFoundError:
+        save_json(key, [record], durable=durable)
+
+
+def update_json(file_path: str, key_field: str, key_value: Any, changes: Dict,
+                durable: bool = False):
+    """
+    Update fields of a record in a JSON list file without rewriting the file.
+
+    The first record whose key_field equals key_value gets the changes, through
+    a single journal line as in append_json. Nothing changes if no record matches.
+    Raises OSError if the file does not exist or cannot be written.
+    """
+    _write_entry(os.path.abspath(file_path),
+                 {"op": "update", "key": key_field, "value": key_value, "changes": changes},
+                 durable)
+
+
+def save_json(file_path: str, data: Any, durable: bool = False):
+    """
+    Save data to a JSON file (indented, for readability) with a single write.
+
+    The data is written to a temporary file that then replaces the target, so
+    readers never see a partially written file. With durable=True it is also
+    flushed to disk first. The file's journal, if any, is removed since the
+    saved data supersedes it; data read from the file must have been read
+    inside the same write_lock block, or records journaled since are lost.
+
+    The saved object becomes the cached data that load_json hands out, so the
+    caller must not mutate it afterwards.
+    Raises OSError if the file cannot be written.
+    """
+    key = os.path.abspath(file_path)
+    _ensure_dir(key)
+    with _write_lock(key):
+        _save_locked(key, data, durable)
+
+
+def _save_locked(key: str, data: Any, durable: bool):
+    """Save data as save_json does; the caller holds the file's write lock."""
+    if ORJSON_AVAILABLE:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(data, indent=2).encode('utf-8')
+
+    invalidate(key)
+    temp_path = f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, key)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    try:
+        os.remove(key + JOURNAL_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+    # Write through, so the next load_json does not read back what was just written
+    try:
+        stamp = file_stamp(key)
+    except OSError:
+        return
+    with _lock:
+        _cache[key] = (stamp, data)
+
+
+def invalidate(file_path: str = None):
+    """Forget the cached data for a file, or for all files if no path is given."""
+    with _lock:
+        if file_path is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(file_path), None)
@@ -0,0 +1,39 @@
+"""
+Keyword Matcher
+Finds which of a fixed set of keywords occur anywhere in a text.
+"""
+
+from typing import Iterable, Set
+
+# Try to import pyahocorasick for single-pass matching, but make it optional
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+class KeywordMatcher:
+    """
+    Substring matcher for a fixed keyword set.
+
+    With pyahocorasick installed all keywords are found in one pass over the
+    text; otherwise each keyword is checked with ``in``. Both report every
+    keyword that occurs as a substring, overlapping matches included.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(dict.fromkeys(keywords))
+        self._automaton = None
+        if AHOCORASICK_AVAILABLE and self.keywords:
+            automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                automaton.add_word(keyword, keyword)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def find(self, text: str) -> Set[str]:
+        """Get the set of keywords that occur in the text."""
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(text)}
+        return {keyword for keyword in self.keywords if keyword in text}
@@ -3,15 +3,17 @@ Notification System
 Handles email and SMS reminders for appointments.
 """
 
-import json
 import os
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from email_validator import validate_email, EmailNotValidError
 import schedule
 import time
 
+from app.utils import json_store
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,6 +26,7 @@ class NotificationManager:
             self.data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
         else:
             self.data_dir = data_dir
+        self.appointments_file = os.path.join(self.data_dir, "appointments.json")
         
         self.reminder_schedule = {
             "first_reminder": 7,   # 7 days before
@@ -238,31 +241,32 @@ class NotificationManager:
     def process_reminder_response(self, appointment_id: str, responses: Dict) -> Dict:
         """Process responses from interactive reminders."""
         try:
-            # Load appointments
-            appointments = self._load_appointments()
-            
-            # Find appointment
-            appointment = None
-            for apt in appointments:
-                if apt.get('appointment_id') == appointment_id:
-                    appointment = apt
-                    break
-            
-            if not appointment:
-                return {"success": False, "message": "Appointment not found"}
-            
-            # Process responses
-            appointment['reminder_responses'] = appointment.get('reminder_responses', {})
-            appointment['reminder_responses'][datetime.now().isoformat()] = responses
-            
-            # Handle cancellation if indicated
-            if responses.get('visit_confirmed', '').lower() in ['no', 'false', 'cancel']:
-                appointment['status'] = 'cancelled'
-                appointment['cancelled_at'] = datetime.now().isoformat()
-                appointment['cancellation_reason'] = responses.get('cancellation_reason', 'Patient initiated')
-            
-            # Update appointment
-            self._save_appointments(appointments)
+            with json_store.write_lock(self.appointments_file):
+                # Load appointments
+                appointments = self._load_appointments()
+                
+                # Find appointment
+                appointment = None
+                for apt in appointments:
+                    if apt.get('appointment_id') == appointment_id:
+                        appointment = apt
+                        break
+                
+                if not appointment:
+                    return {"success": False, "message": "Appointment not found"}
+                
+                # Process responses
+                appointment['reminder_responses'] = appointment.get('reminder_responses', {})
+                appointment['reminder_responses'][datetime.now().isoformat()] = responses
+                
+                # Handle cancellation if indicated
+                if responses.get('visit_confirmed', '').lower() in ['no', 'false', 'cancel']:
+                    appointment['status'] = 'cancelled'
+                    appointment['cancelled_at'] = datetime.now().isoformat()
+                    appointment['cancellation_reason'] = responses.get('cancellation_reason', 'Patient initiated')
+                
+                # Update appointment
+                self._save_appointments(appointments)
             
             return {
                 "success": True,
@@ -480,26 +484,39 @@ HealthCare+ Team
     
     def _load_appointments(self) -> List[Dict]:
         """Load appointments from file."""
-        filepath = os.path.join(self.data_dir, "appointments.json")
         try:
-            if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    return json.load(f)
+            return json_store.read_json(self.appointments_file)
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.error(f"Error loading appointments: {e}")
         return []
     
     def _save_appointments(self, appointments: List[Dict]):
         """Save appointments to file."""
-        filepath = os.path.join(self.data_dir, "appointments.json")
         try:
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            with open(filepath, 'w') as f:
-                json.dump(appointments, f, indent=2)
+            json_store.save_json(self.appointments_file, appointments)
         except Exception as e:
             logger.error(f"Error saving appointments: {e}")
 
 
+# Shared NotificationManager instances keyed by absolute data directory
+_notification_managers: Dict[Optional[str], NotificationManager] = {}
+_notification_managers_lock = threading.Lock()
+
+
+def get_notification_manager(data_dir: str = None) -> NotificationManager:
+    """Get the shared NotificationManager for a data directory, creating it on first use."""
+    key = os.path.abspath(data_dir) if data_dir else None
+    manager = _notification_managers.get(key)
+    if manager is None:
+        with _notification_managers_lock:
+            manager = _notification_managers.get(key)
+            if manager is None:
+                manager = _notification_managers[key] = NotificationManager(data_dir)
+    return manager
+
+
 if __name__ == "__main__":
     # Test the notification manager
     print("Testing NotificationManager...")
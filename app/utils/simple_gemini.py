@@ -2,13 +2,21 @@
 Simple Google Gemini API client when the google-generativeai package is not available.
 """
 import json
-import urllib.request
 import urllib.parse
 import urllib.error
 import time
 import random
 import logging
 
+from app.utils.http_session import KeepAliveSession
+
+# Try to import orjson for faster request/response JSON handling, but make it optional
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,6 +26,8 @@ class SimpleGeminiClient:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://generativelanguage.googleapis.com/v1beta"
+        # Reuses one connection per thread across completions and retries
+        self.session = KeepAliveSession(self.base_url)
     
     def create_completion(self, model: str = "gemini-1.5-flash", messages: list = None, temperature: float = 0.7, max_tokens: int = 500, max_retries: int = 3):
         """Create a chat completion using the Gemini API with retry logic."""
@@ -49,7 +59,7 @@ class SimpleGeminiClient:
         
         # Prepare the URL - use generateContent endpoint
         model_name = model if model.startswith("gemini-") else "gemini-1.5-flash"
-        url = f"{self.base_url}/models/{model_name}:generateContent?key={self.api_key}"
+        path = f"/models/{model_name}:generateContent?key={self.api_key}"
         
         headers = {
             "Content-Type": "application/json"
@@ -72,26 +82,20 @@ class SimpleGeminiClient:
                 "parts": [{"text": system_instruction}]
             }
         
+        # Encode the body once; retries resend the same bytes
+        body = orjson.dumps(data) if ORJSON_AVAILABLE else json.dumps(data).encode('utf-8')
         
         # Make the API request with retry logic
         for attempt in range(max_retries + 1):
             try:
-                # Create request
-                request = urllib.request.Request(
-                    url,
-                    data=json.dumps(data).encode('utf-8'),
-                    headers=headers,
-                    method='POST'
-                )
-                
                 # Make request
-                with urllib.request.urlopen(request, timeout=30) as response:
-                    response_data = json.loads(response.read().decode('utf-8'))
-                    
-                    # Convert Gemini response to OpenAI-like format for compatibility
-                    openai_format = self._convert_to_openai_format(response_data)
-                    logger.info(f"Gemini API call successful on attempt {attempt + 1}")
-                    return openai_format
+                raw = self.session.post(path, body, headers, timeout=30)
+                response_data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw.decode('utf-8'))
+                
+                # Convert Gemini response to OpenAI-like format for compatibility
+                openai_format = self._convert_to_openai_format(response_data)
+                logger.info(f"Gemini API call successful on attempt {attempt + 1}")
+                return openai_format
                     
             except urllib.error.HTTPError as e:
                 error_body = e.read().decode('utf-8') if hasattr(e, 'read') else str(e)
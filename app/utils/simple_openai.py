@@ -2,10 +2,18 @@
 Simple OpenAI API client when the openai package is not available.
 """
 import json
-import urllib.request
 import urllib.parse
 import urllib.error
 
+from app.utils.http_session import KeepAliveSession
+
+# Try to import orjson for faster request/response JSON handling, but make it optional
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 
 class SimpleOpenAIClient:
     """Simple OpenAI API client using only standard library."""
@@ -13,11 +21,11 @@ class SimpleOpenAIClient:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://api.openai.com/v1"
+        # Reuses one connection per thread across completions
+        self.session = KeepAliveSession(self.base_url)
     
     def create_completion(self, model: str, messages: list, temperature: float = 0.7, max_tokens: int = 500):
         """Create a chat completion using the OpenAI API."""
-        url = f"{self.base_url}/chat/completions"
-        
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -30,19 +38,13 @@ class SimpleOpenAIClient:
             "max_tokens": max_tokens
         }
         
+        body = orjson.dumps(data) if ORJSON_AVAILABLE else json.dumps(data).encode('utf-8')
+        
         try:
-            # Create request
-            request = urllib.request.Request(
-                url,
-                data=json.dumps(data).encode('utf-8'),
-                headers=headers,
-                method='POST'
-            )
-            
             # Make request
-            with urllib.request.urlopen(request, timeout=30) as response:
-                response_data = json.loads(response.read().decode('utf-8'))
-                return response_data
+            raw = self.session.post("/chat/completions", body, headers, timeout=30)
+            response_data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw.decode('utf-8'))
+            return response_data
                 
         except urllib.error.HTTPError as e:
             error_body = e.read().decode('utf-8') if hasattr(e, 'read') else str(e)
@@ -0,0 +1,62 @@
+"""
+Tests for the LLM circuit breaker.
+"""
+import threading
+import time
+
+from app.config import CircuitBreaker
+
+
+def _failing_then(results):
+    calls = []
+
+    def fn(prompt):
+        calls.append(prompt)
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return fn, calls
+
+
+def test_failure_opens_the_breaker_until_the_cooldown_passes():
+    fn, calls = _failing_then([RuntimeError("down"), "api"])
+    breaker = CircuitBreaker(fn, lambda prompt: "fallback", "test", cooldown=0.05)
+
+    assert breaker("a") == "fallback"
+    assert breaker.is_open
+    assert breaker("b") == "fallback"
+    assert calls == ["a"]
+
+    time.sleep(0.06)
+    assert breaker("c") == "api"
+    assert not breaker.is_open
+
+
+def test_half_open_breaker_lets_one_trial_call_through():
+    release = threading.Event()
+    calls = []
+
+    def fn(prompt):
+        calls.append(prompt)
+        if len(calls) == 1:
+            raise RuntimeError("down")
+        release.wait(1)
+        return "api"
+
+    breaker = CircuitBreaker(fn, lambda prompt: "fallback", "test", cooldown=0.01)
+    breaker("first")
+    time.sleep(0.02)
+
+    trial = threading.Thread(target=breaker, args=("trial",))
+    trial.start()
+    while len(calls) < 2:
+        time.sleep(0.001)
+    # Other callers get the fallback while the trial call is running
+    assert [breaker("other") for _ in range(5)] == ["fallback"] * 5
+    release.set()
+    trial.join()
+
+    assert calls == ["first", "trial"]
+    assert breaker("after") == "api"
@@ -0,0 +1,142 @@
+"""
+Tests for the journaled JSON data store.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.utils import json_store
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = str(tmp_path / "records.json")
+    json_store.save_json(path, [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}])
+    yield path
+    json_store.invalidate()
+
+
+def _file_records(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_append_goes_to_the_journal_and_is_read_back(data_file):
+    json_store.append_json(data_file, {"id": 3, "name": "c"})
+
+    assert [r["id"] for r in _file_records(data_file)] == [1, 2]
+    assert os.path.exists(data_file + json_store.JOURNAL_SUFFIX)
+    assert [r["id"] for r in json_store.read_json(data_file)] == [1, 2, 3]
+    assert [r["id"] for r in json_store.load_json(data_file)] == [1, 2, 3]
+
+
+def test_replay_skips_a_torn_entry(data_file):
+    json_store.append_json(data_file, {"id": 3, "name": "c"})
+    with open(data_file + json_store.JOURNAL_SUFFIX, "ab") as f:
+        f.write(b'\n{"op": "append", "rec')
+    json_store.append_json(data_file, {"id": 4, "name": "d"})
+
+    json_store.invalidate()
+    assert [r["id"] for r in json_store.read_json(data_file)] == [1, 2, 3, 4]
+
+
+def test_save_folds_the_journal_into_the_file(data_file):
+    json_store.append_json(data_file, {"id": 3, "name": "c"})
+    records = json_store.read_json(data_file)
+    json_store.save_json(data_file, records)
+
+    assert not os.path.exists(data_file + json_store.JOURNAL_SUFFIX)
+    assert [r["id"] for r in _file_records(data_file)] == [1, 2, 3]
+
+
+def test_large_journal_is_compacted(data_file, monkeypatch):
+    monkeypatch.setattr(json_store, "JOURNAL_COMPACT_BYTES", 64)
+    for i in range(3, 8):
+        json_store.append_json(data_file, {"id": i, "name": "x"})
+
+    expected = list(range(1, 8))
+    assert [r["id"] for r in json_store.read_json(data_file)] == expected
+    # Compaction saved the journaled records into the file itself
+    assert len(_file_records(data_file)) > 2
+
+
+def test_load_json_reuses_data_until_the_file_changes(data_file):
+    first = json_store.load_json(data_file)
+    assert json_store.load_json(data_file) is first
+
+    json_store.append_json(data_file, {"id": 3, "name": "c"})
+    second = json_store.load_json(data_file)
+    assert second is not first
+    assert len(first) == 2 and len(second) == 3
+
+
+def test_append_creates_a_missing_file(tmp_path):
+    path = str(tmp_path / "new" / "records.json")
+    json_store.append_json(path, {"id": 1})
+
+    assert _file_records(path) == [{"id": 1}]
+    json_store.invalidate()
+
+
+def test_update_changes_the_first_matching_record(data_file):
+    json_store.update_json(data_file, "id", 2, {"name": "B"})
+    json_store.update_json(data_file, "id", 99, {"name": "missing"})
+
+    assert json_store.read_json(data_file) == [{"id": 1, "name": "a"}, {"id": 2, "name": "B"}]
+
+
+def test_update_applies_to_a_record_appended_earlier(data_file):
+    json_store.append_json(data_file, {"id": 3, "name": "c"})
+    json_store.update_json(data_file, "id", 3, {"name": "C"})
+
+    assert json_store.read_json(data_file)[-1] == {"id": 3, "name": "C"}
+
+
+def test_read_modify_write_inside_write_lock(data_file):
+    with json_store.write_lock(data_file):
+        records = json_store.read_json(data_file)
+        records.append({"id": 3, "name": "c"})
+        # The lock is re-entrant, so saving inside the block does not deadlock
+        json_store.save_json(data_file, records)
+
+    assert [r["id"] for r in _file_records(data_file)] == [1, 2, 3]
+
+
+# Appends one record to a data file, as another process would
+_OTHER_PROCESS_APPEND = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from app.utils import json_store
+json_store.append_json(sys.argv[2], {"id": "other-process"})
+"""
+
+
+@pytest.mark.skipif(not json_store.FCNTL_AVAILABLE, reason="needs cross-process file locks")
+def test_cache_keeps_an_append_made_by_another_process_during_a_write(data_file, monkeypatch):
+    json_store.load_json(data_file)
+    real_file_stamp = json_store.file_stamp
+    others = []
+
+    def file_stamp(path):
+        # Once this process has journaled its entry, another process appends too
+        if not others and os.path.exists(path + json_store.JOURNAL_SUFFIX):
+            others.append(subprocess.Popen([sys.executable, "-c", _OTHER_PROCESS_APPEND, REPO_ROOT, path]))
+            try:
+                # The write lock should hold it off until this write is done
+                others[0].wait(timeout=0.5)
+            except subprocess.TimeoutExpired:
+                pass
+        return real_file_stamp(path)
+
+    monkeypatch.setattr(json_store, "file_stamp", file_stamp)
+    json_store.append_json(data_file, {"id": 3, "name": "c"})
+    monkeypatch.undo()
+    assert others[0].wait(timeout=10) == 0
+
+    assert json_store.load_json(data_file) == json_store.read_json(data_file)
+    assert [r["id"] for r in json_store.load_json(data_file)] == [1, 2, 3, "other-process"]
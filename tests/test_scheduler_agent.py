@@ -0,0 +1,128 @@
+"""
+Tests for the rule-based scheduler agent.
+"""
+import threading
+
+import pytest
+
+from app.agents.scheduler_agent import ConversationState, SchedulerAgent
+from app.utils import json_store
+
+# A Monday
+DATE = "2030-01-07"
+
+DOCTORS = [
+    {
+        "doctor_id": "D001",
+        "first_name": "Ada",
+        "last_name": "Lane",
+        "specialty": "Cardiology",
+        "schedule": {"Monday": {"start_time": "09:00", "end_time": "13:30"}},
+    },
+    {
+        "doctor_id": "D002",
+        "first_name": "Ben",
+        "last_name": "Park",
+        "specialty": "Dermatology",
+        "schedule": {"Monday": {"start_time": "09:00", "end_time": "13:30"}},
+    },
+]
+
+
+def _appointment(appointment_id, time, status="scheduled", doctor_id="D001", date=DATE, **extra):
+    return {"appointment_id": appointment_id, "doctor_id": doctor_id, "date": date,
+            "time": time, "status": status, **extra}
+
+
+@pytest.fixture
+def agent(tmp_path):
+    json_store.save_json(str(tmp_path / "doctors.json"), DOCTORS)
+    json_store.save_json(str(tmp_path / "patients.json"), [])
+    json_store.save_json(str(tmp_path / "appointments.json"), [])
+    scheduler = SchedulerAgent()
+    scheduler.data_dir = str(tmp_path)
+    yield scheduler
+    json_store.invalidate()
+
+
+def _set_appointments(agent, appointments):
+    json_store.save_json(agent._data_path("appointments.json"), appointments)
+
+
+def test_all_slots_are_free_without_appointments(agent):
+    assert agent.get_available_slots("D001", DATE) == [
+        "09:00", "09:30", "10:00", "10:30", "11:00", "11:30", "13:00"
+    ]
+
+
+def test_scheduled_appointments_exclude_overlapping_slots(agent):
+    _set_appointments(agent, [
+        _appointment("APT0001", "09:30"),
+        _appointment("APT0002", "10:30 AM", duration_minutes=60),
+    ])
+
+    assert agent.get_available_slots("D001", DATE) == ["09:00", "10:00", "11:30", "13:00"]
+
+
+def test_only_scheduled_appointments_of_that_doctor_and_date_count(agent):
+    _set_appointments(agent, [
+        _appointment("APT0001", "09:00", status="cancelled"),
+        _appointment("APT0002", "09:30", doctor_id="D002"),
+        _appointment("APT0003", "10:00", date="2030-01-14"),
+        _appointment("APT0004", "1:00 PM"),
+    ])
+
+    assert agent.get_available_slots("D001", DATE) == [
+        "09:00", "09:30", "10:00", "10:30", "11:00", "11:30"
+    ]
+
+
+def test_longer_slots_skip_partially_booked_time(agent):
+    _set_appointments(agent, [_appointment("APT0001", "10:30", duration_minutes=30)])
+
+    assert agent.get_available_slots("D001", DATE, duration=60) == ["09:00", "11:00"]
+
+
+def test_appointments_without_a_duration_use_the_requested_one(agent):
+    _set_appointments(agent, [_appointment("APT0001", "10:30")])
+
+    assert agent.get_available_slots("D001", DATE, duration=60) == ["09:00"]
+
+
+def test_unknown_doctor_or_day_off_has_no_slots(agent):
+    assert agent.get_available_slots("D999", DATE) == []
+    # A Saturday
+    assert agent.get_available_slots("D001", "2030-01-12") == []
+
+
+def test_confirmation_step_farewell_resets_the_conversation(agent):
+    agent.conversation_state = ConversationState(step="confirmation", patient_name="Ada")
+
+    response = agent.generate_response("thanks, bye")
+
+    assert response.startswith("You're welcome!")
+    assert agent.conversation_state.step == "initial"
+    assert agent.conversation_state.patient_name is None
+
+
+def test_modification_type_step_dispatches_to_the_requested_lookup(agent):
+    agent.conversation_state = ConversationState(step="modification_type")
+
+    agent.generate_response("Just check for Ada Lane")
+
+    assert agent.conversation_state.modification_action == "check"
+
+
+def test_concurrent_bookings_get_distinct_appointment_ids(agent):
+    patient = {"patient_id": "P0001", "first_name": "Ada", "last_name": "Lane"}
+    threads = [
+        threading.Thread(target=agent.book_appointment, args=(patient, "D001", DATE, "09:00"))
+        for _ in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    appointments = json_store.read_json(agent._data_path("appointments.json"))
+    assert len({a["appointment_id"] for a in appointments}) == 20